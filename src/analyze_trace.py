@@ -0,0 +1,104 @@
+import sys
+import json
+import argparse
+
+import pandas as pd
+
+from players.trace import PARTS
+
+
+def load_trace(filenames):
+    """Load the records of the trace files of `SearchTracer` into a
+    DataFrame, with a column per part of the time.
+    """
+    records = []
+    for filename in filenames:
+        with open(filename) as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    record['file'] = filename
+                    for part in PARTS:
+                        record[part] = record['times'][part]
+                    records.append(record)
+    df = pd.DataFrame(records)
+    if not records:
+        return df
+    df['search'] = df['time'] - df[list(PARTS)].sum(axis=1)
+    return df
+
+
+def time_split(df):
+    """Return the share of the time of each part, and of the search
+    itself, per player.
+    """
+    parts = list(PARTS) + ['search']
+    split = df.groupby('player')[parts].sum()
+    return split.div(split.sum(axis=1), axis=0)
+
+
+def summarize(df, top=10):
+    searches = df[df['type'] == 'search']
+    depths = df[df['type'] == 'depth']
+
+    print('=' * 70)
+    print('Searches per player:')
+    per_player = searches.groupby('player').agg(
+        searches=('time', 'size'),
+        mean_time=('time', 'mean'),
+        total_time=('time', 'sum'),
+        mean_depth=('depth', 'mean'),
+        timeout_rate=('timeout', 'mean'),
+        nodes=('nodes', 'sum'))
+    per_player['nps'] = per_player['nodes'] / per_player['total_time']
+    print(per_player)
+
+    print('=' * 70)
+    print('Share of the time:')
+    print(time_split(searches))
+
+    print('=' * 70)
+    print('Searches by step of the game:')
+    phase = (searches['step'] // 10) * 10
+    print(searches.groupby(['player', phase]).agg(
+        searches=('time', 'size'),
+        mean_time=('time', 'mean'),
+        mean_depth=('depth', 'mean'),
+        timeout_rate=('timeout', 'mean'),
+        eval_time=('eval', 'mean'),
+        movegen_time=('movegen', 'mean')))
+
+    if len(depths):
+        print('=' * 70)
+        print('Depths:')
+        per_depth = depths.groupby(['player', 'depth']).agg(
+            completed=('time', 'size'),
+            mean_time=('time', 'mean'),
+            mean_nodes=('nodes', 'mean'))
+        per_depth['ebf'] = per_depth['mean_nodes'] \
+            / per_depth.groupby(level='player')['mean_nodes'].shift(1)
+        print(per_depth)
+
+    print('=' * 70)
+    print('Slowest searches:')
+    print(searches.nlargest(top, 'time')[
+        ['player', 'game', 'step', 'hash', 'depth', 'time', 'nodes',
+         'timeout', 'eval', 'movegen', 'board', 'search']]
+        .to_string(index=False))
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description='Summarize the search traces of a tournament.')
+    parser.add_argument('files', nargs='+', help='trace files (JSON lines)')
+    parser.add_argument('--top', type=int, default=10,
+                        help='number of slowest searches to list')
+    args = parser.parse_args()
+
+    df = load_trace(args.files)
+    if not len(df):
+        sys.exit('No records in the traces.')
+    pd.set_option('display.width', 200)
+    pd.set_option('display.max_columns', None)
+    summarize(df, args.top)
@@ -0,0 +1,423 @@
+import io
+import os
+import sys
+import json
+import random
+import timeit
+import argparse
+import platform
+import contextlib
+
+from board import Board, BitBoard, CompactBoard
+from players.minimax import AlphaBetaPlayer
+from players.trace import encode_score
+
+from strategies.scores import NullScore, AdvancedScore
+from strategies.get_limited_moves import null_lm, advanced_lm
+
+
+# (height, width, m) of the corpora
+CONFIGS = ((12, 12, 6), (15, 15, 5))
+
+# Share of the cells taken in the positions of each phase of the game
+PHASES = (('early', 0.07), ('middle', 0.28), ('late', 0.55))
+
+BOARD_CLASSES = (Board, BitBoard, CompactBoard)
+
+
+def make_positions(height, width, m, n_stones, n_positions):
+    """Return `n_positions` histories of `n_stones` moves, each next to a
+    stone already played, without a winner. The positions are the same on
+    every run and machine for the same arguments.
+    """
+    rng = random.Random('{}x{}m{}-{}'.format(height, width, m, n_stones))
+    positions = []
+    while len(positions) < n_positions:
+        board = BitBoard.from_moves([], height, width, m)
+        history = []
+        while len(history) < n_stones:
+            mark = 'OX'[len(history) % 2]
+            if history:
+                near = board.geometry.neighbourhoods(2)
+                bits = 0
+                for _, move in history:
+                    bits |= near[move]
+                cells = board.geometry.mask_cells(bits & board.empty_bits)
+            else:
+                cells = [(height // 2, width // 2)]
+            rng.shuffle(cells)
+            for move in cells:
+                board.push(move, mark)
+                if board.winner is None:
+                    history.append((mark, move))
+                    break
+                board.pop()
+            else:
+                # Every cell near the stones wins: start again
+                break
+        if len(history) == n_stones:
+            positions.append(history)
+    return positions
+
+
+def make_corpora(n_positions):
+    """Return {(config, phase): list of histories} for every config and
+    phase.
+    """
+    corpora = {}
+    for height, width, m in CONFIGS:
+        for phase, share in PHASES:
+            n_stones = int(share * height * width)
+            corpora[('{}x{}m{}'.format(height, width, m), phase)] = \
+                make_positions(height, width, m, n_stones, n_positions)
+    return corpora
+
+
+def get_score_fn(m, data_dir):
+    """Return the `AdvancedScore` of `m`, or None if it has no tables."""
+    if not os.path.exists(os.path.join(data_dir, '{}.pkl'.format(m))):
+        return None
+    return AdvancedScore(m, data_dir)
+
+
+def bench_ops(histories, config, depth, score_fns):
+    """Return {name: op} for the positions of a corpus, where an op is a
+    callable doing one operation on one of the positions in turn.
+    """
+    height, width, m = config
+    ops = {}
+
+    def cycle(items, fn):
+        # An op working on each of the items in turn
+        state = {'k': 0}
+
+        def op():
+            k = state['k']
+            state['k'] = (k + 1) % len(items)
+            fn(*items[k])
+        return op
+
+    for board_class in BOARD_CLASSES:
+        boards = [board_class.from_moves(h, height, width, m)
+                  for h in histories]
+        marks = ['OX'[len(h) % 2] for h in histories]
+        moves = [b.legal_moves[len(b.legal_moves) // 2] for b in boards]
+        items = list(zip(boards, marks, moves))
+        name = board_class.__name__
+
+        def apply_move(board, mark, move):
+            # A board takes one move with apply_move, then is replaced
+            board.apply_move(move, mark)
+            board.pop()
+            board.moved = False
+
+        def legal_moves(board, mark, move):
+            board._legal_moves = None
+            board.legal_moves
+
+        ops['{}.apply_move'.format(name)] = cycle(items, apply_move)
+        ops['{}.copy'.format(name)] = \
+            cycle(items, lambda board, mark, move: board.copy())
+        ops['{}.is_winner'.format(name)] = \
+            cycle(items, lambda board, mark, move: board.is_winner(mark))
+        ops['{}.legal_moves'.format(name)] = cycle(items, legal_moves)
+
+    boards = [BitBoard.from_moves(h, height, width, m) for h in histories]
+    items = [(b, 'OX'[len(h) % 2]) for b, h in zip(boards, histories)]
+    ops['null_lm'] = cycle(items, null_lm)
+    ops['advanced_lm'] = cycle(items, advanced_lm)
+    ops['NullScore.get_score'] = cycle(items, NullScore().get_score)
+    score_fn = score_fns.get(m)
+    if score_fn is not None:
+        ops['AdvancedScore.get_score'] = cycle(items, score_fn.get_score)
+
+    # A fixed-depth search from empty tables, with the null score where
+    # there are no tables of m. The players are made once, outside the
+    # timed op, with a small table to clear for each search.
+    players = []
+    for board, mark in items:
+        player = AlphaBetaPlayer(score_fn=score_fn or NullScore(),
+                                 limited_moves_fn=advanced_lm, tt_size_mb=1)
+        player.assign_player_mark(mark)
+        player.time_left = lambda: float("inf")
+        players.append((player, board))
+
+    def alphabeta(player, board):
+        player.new_search()
+        player.start_clock()
+        with contextlib.redirect_stdout(io.StringIO()):
+            player.alphabeta(board, depth)
+
+    ops['alphabeta.depth{}'.format(depth)] = cycle(players, alphabeta)
+    return ops
+
+
+def search_to_depth(history, config, depth, score_fn):
+    """Search the position of `history` with `AlphaBetaPlayer` from empty
+    tables, to `depth` and without a time limit.
+
+    Returns
+    -------
+    dict
+        The best move, its score, the nodes searched by all the depths, and
+        the time to reach `depth`, in seconds.
+    """
+    height, width, m = config
+    board = BitBoard.from_moves(history, height, width, m)
+    player = AlphaBetaPlayer(score_fn=score_fn or NullScore(),
+                             limited_moves_fn=advanced_lm, seed=0)
+    player.assign_player_mark('OX'[len(history) % 2])
+    player.time_left = lambda: float("inf")
+    player.start_clock()
+
+    best_move = None
+    start = timeit.default_timer()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for best_move in player.deepen(board):
+            if player.completed_depth >= depth:
+                break
+    elapsed = timeit.default_timer() - start
+    return {'move': list(best_move) if best_move is not None else None,
+            'score': encode_score(player.best_score),
+            'nodes': player.nodes,
+            'time': elapsed}
+
+
+def read_golden(filename):
+    """Read a golden file: a line with the depth of the searches, then a
+    line per position, with its history and the results of its search.
+
+    Returns
+    -------
+    (int, list of dict)
+        The depth and the positions.
+    """
+    with open(filename) as f:
+        lines = [json.loads(line) for line in f if line.strip()]
+    return lines[0]['depth'], lines[1:]
+
+
+def write_golden(filename, depth, positions):
+    # One compact line per position, so a regenerated file diffs by
+    # position
+    with open(filename, 'w') as f:
+        for record in [{'depth': depth}] + positions:
+            f.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+
+def run_regression(args):
+    """Search the positions of the golden file to its depth, and compare
+    the best moves, scores and node counts with it. With `update_golden`,
+    or if there is no golden file, search the corpora to `depth` and write
+    the file.
+
+    The golden file only holds results which don't depend on the machine.
+    The times to depth are compared with `baseline_results`, a baseline
+    saved by an earlier run, by position.
+
+    Returns
+    -------
+    (list of str, dict)
+        The positions whose best move or score differ from the golden
+        file, and the time (in seconds) to depth of each position.
+    """
+    if os.path.exists(args.golden) and not args.update_golden:
+        depth, positions = read_golden(args.golden)
+    else:
+        depth, positions = args.depth, []
+        for (config_name, phase), histories in \
+                make_corpora(args.positions).items():
+            config = next(c for c in CONFIGS
+                          if '{}x{}m{}'.format(*c) == config_name)
+            for k, history in enumerate(histories):
+                positions.append({
+                    'name': '{}/{}/{}'.format(config_name, phase, k),
+                    'config': list(config),
+                    'history': [[mark, list(move)]
+                                for mark, move in history]})
+
+    score_fns = {m: get_score_fn(m, args.data_dir) for _, _, m in CONFIGS}
+    changed = []
+    times = {}
+    total = {'nodes': 0, 'golden_nodes': 0, 'time': 0., 'baseline_time': 0.}
+    print('Fixed-depth searches to depth {}:'.format(depth))
+    for position in positions:
+        name = position['name']
+        if args.filter and args.filter not in name:
+            continue
+        config = tuple(position['config'])
+        history = [(mark, tuple(move)) for mark, move in position['history']]
+        result = search_to_depth(history, config, depth,
+                                 score_fns.get(config[2]))
+        times[name] = result.pop('time')
+
+        line = '{:<24} {:>8} {:>10} nodes {:>8.3f} s'.format(
+            name, str(tuple(result['move'])), result['nodes'], times[name])
+        if 'nodes' in position:
+            total['golden_nodes'] += position['nodes']
+            line += '   {:>+7.1%} nodes'.format(
+                float(result['nodes'] - position['nodes'])
+                / max(1, position['nodes']))
+        if name in args.baseline_results:
+            total['baseline_time'] += args.baseline_results[name]
+            line += ' {:>+7.1%} time'.format(
+                times[name] / max(1e-9, args.baseline_results[name]) - 1.)
+        if 'nodes' in position and (result['move'] != position['move']
+                                    or result['score'] != position['score']):
+            line += '   CHANGED: {} ({}) in the golden file'.format(
+                tuple(position['move']), position['score'])
+            changed.append(name)
+        print(line)
+        sys.stdout.flush()
+        total['nodes'] += result['nodes']
+        total['time'] += times[name]
+        if args.update_golden or 'nodes' not in position:
+            position.update(result)
+
+    print('=' * 70)
+    print('Total: {} nodes, {:.3f} s to depth {}'.format(
+        total['nodes'], total['time'], depth))
+    if total['golden_nodes']:
+        print('Golden: {} nodes ({:+.1%})'.format(
+            total['golden_nodes'],
+            total['nodes'] / float(total['golden_nodes']) - 1.))
+    if total['baseline_time']:
+        print('Baseline: {:.3f} s ({:+.1%})'.format(
+            total['baseline_time'],
+            total['time'] / total['baseline_time'] - 1.))
+    if args.update_golden or not os.path.exists(args.golden):
+        write_golden(args.golden, depth, positions)
+        print('Golden file written:', args.golden)
+    return changed, times
+
+
+def measure(op, min_time, repeat):
+    """Return the ops per second of `op`, the best of `repeat` runs of at
+    least `min_time` seconds.
+    """
+    # Run the ops in batches of about a millisecond between reads of the
+    # timer, so reading it doesn't weigh on fast ops
+    n_ops = 0
+    start = timeit.default_timer()
+    while timeit.default_timer() - start < 0.01:
+        op()
+        n_ops += 1
+    batch = max(1, n_ops // 10)
+
+    best = 0.
+    for _ in range(repeat):
+        n_ops = 0
+        start = timeit.default_timer()
+        while True:
+            for _ in range(batch):
+                op()
+            n_ops += batch
+            elapsed = timeit.default_timer() - start
+            if elapsed >= min_time:
+                break
+        best = max(best, n_ops / elapsed)
+    return best
+
+
+def run(args):
+    corpora = make_corpora(args.positions)
+    score_fns = {m: get_score_fn(m, args.data_dir) for _, _, m in CONFIGS}
+    results = {}
+    for (config_name, phase), histories in corpora.items():
+        config = next(c for c in CONFIGS
+                      if '{}x{}m{}'.format(*c) == config_name)
+        ops = bench_ops(histories, config, args.depth, score_fns)
+        for op_name, op in ops.items():
+            name = '{}/{}/{}'.format(config_name, phase, op_name)
+            if args.filter and args.filter not in name:
+                continue
+            results[name] = measure(op, args.min_time, args.repeat)
+            print_result(name, results[name], args.baseline_results)
+    return results
+
+
+def print_result(name, ops_per_sec, baseline):
+    line = '{:<48} {:>14.1f} ops/s'.format(name, ops_per_sec)
+    if name in baseline:
+        line += '   {:>+7.1%} vs baseline'.format(
+            ops_per_sec / baseline[name] - 1.)
+    print(line)
+    sys.stdout.flush()
+
+
+def compare(results, baseline, tolerance):
+    """Return the names of the benchmarks slower than the baseline by more
+    than `tolerance`, a share of the baseline ops per second.
+    """
+    return [name for name, ops_per_sec in results.items()
+            if name in baseline
+            and ops_per_sec < (1. - tolerance) * baseline[name]]
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description='Time the boards, move generators, score functions and '
+                    'fixed-depth searches on fixed position corpora.')
+    parser.add_argument('--positions', type=int, default=5,
+                        help='positions per corpus')
+    parser.add_argument('--depth', type=int, default=2,
+                        help='depth of the alphabeta searches')
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='least seconds of a timing run')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='timing runs per benchmark, the best counts')
+    parser.add_argument('--filter', default=None,
+                        help='only run the benchmarks with this in the name')
+    parser.add_argument('--data-dir', default='../data/advanced_score/',
+                        help='directory of the AdvancedScore tables')
+    parser.add_argument('--baseline', default=None,
+                        help='JSON file of results to compare with')
+    parser.add_argument('--save', default=None,
+                        help='JSON file to save the results to')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='slowdown vs the baseline that fails the run')
+    parser.add_argument('--golden', default=None,
+                        help='run the fixed-depth search regression against '
+                             'this golden file instead, made if missing '
+                             '(../data/benchmark/search_golden.jsonl is '
+                             'searched to depth 3); --baseline and --save '
+                             'then hold the times to depth')
+    parser.add_argument('--update-golden', action='store_true',
+                        help='search the corpora to --depth and rewrite '
+                             'the golden file')
+    args = parser.parse_args()
+
+    args.baseline_results = {}
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            args.baseline_results = json.load(f)['results']
+
+    if args.golden is not None:
+        changed, results = run_regression(args)
+    else:
+        results = run(args)
+
+    if args.save is not None:
+        with open(args.save, 'w') as f:
+            json.dump({'python': platform.python_version(),
+                       'machine': platform.machine(),
+                       'results': results}, f, indent=2, sort_keys=True)
+
+    if args.golden is not None:
+        if changed:
+            print('=' * 70)
+            print('Best moves or scores changed:')
+            for name in changed:
+                print(' ', name)
+            sys.exit(1)
+        sys.exit(0)
+
+    slower = compare(results, args.baseline_results, args.tolerance)
+    if slower:
+        print('=' * 70)
+        print('Slower than the baseline by more than {:.0%}:'.format(
+            args.tolerance))
+        for name in slower:
+            print(' ', name)
+        sys.exit(1)
@@ -1,6 +1,8 @@
 import numpy as np
 from copy import copy
 from utils import *
+from zobrist import ZOBRIST_SEED, get_zobrist_keys
+from geometry import get_geometry
 
 
 class GameError(Exception):
@@ -8,102 +10,313 @@ class GameError(Exception):
     pass
 
 
-class Board(object):
-    """The board of generalized TIC-TAC-TOE game.
+# Codes of the marks in typed cell buffers, and the marks of the codes
+CELL_CODES = {'-': 0, 'O': 1, 'X': 2}
+CELL_MARKS = '-OX'
+
+
+class BaseBoard(object):
+    """Moves, undo, hashing and game-over bookkeeping shared by the board
+    backends.
+
+    A backend stores the cells and implements `get_mark`, `_set_mark`,
+    `_board_state` and `copy`. The base class declares `__slots__`, so a
+    backend which also does keeps no per-instance `__dict__`.
     """
+    __slots__ = ('m', 'width', 'height', 'moved', 'last_moves', 'geometry',
+                 'zobrist_seed', '_zobrist', 'zobrist_hash', 
+                 'empty_bits', 'n_empty', '_legal_moves', 
+                 'surrond_radius', '_neighbourhoods', 'surround_bits', 
+                 '_surround_moves', 'n_step', '_undo', 'winner')
+    
     BLANK_SPACE = '-'
     PLAYER_1 = 'O'
     PLAYER_2 = 'X'
 
-    def __init__(self, board_str, m, last_moves=None):
-        self.m = m
-        self.board_str = board_str
-        self.moved = False
-        self.last_moves = last_moves if last_moves else {
-            self.PLAYER_1: None,
-            self.PLAYER_2: None
-        }
-        self.width = len(board_str.split('\n')[0])
-        self.height = len(board_str.split('\n')[:-1])
-        self._board_state = self.get_board_state()
-
-        # Surrounding 
-        self.surrond_radius = 1
-        self.surround_moves = []
+    def _init_state(self, zobrist_seed, surround_radius):
+        """Set up the state that moves keep up to date, from the stones
+        already on the board.
+        """
+        # Zobrist hash, updated by every move
+        self.zobrist_seed = zobrist_seed
+        self._zobrist = get_zobrist_keys(self.height, self.width, zobrist_seed)
+        self.zobrist_hash = self.get_zobrist_hash()
         
-        # history_moves
-        self.history_moves = []
+        # Mask and number of the empty cells, updated by every move
+        occupied = self.get_occupied_bits()
+        self.empty_bits = self.geometry.full_mask & ~occupied
+        self.n_empty = len(self.geometry.mask_cells(self.empty_bits))
+        self._legal_moves = None
+
+        # Surrounding: mask of the empty cells within `surrond_radius` of a
+        # stone, updated by every move
+        self.set_surround_radius(surround_radius)
         
         # n_step
         self.n_step = 0
-            
-    def get_board_state(self):
-        state = np.empty((self.height, self.width), dtype='str')
-        for i, row in enumerate(self.board_str.split('\n')[:-1]):
-            for j, cell in enumerate(row):
-                if cell in [self.BLANK_SPACE, self.PLAYER_1, self.PLAYER_2]:
-                    state[i, j] = cell
-                else:
-                    raise GameError("illegal input board!")
         
-        return state
+        # Undo records of the moves made by `push`, as a linked chain of
+        # (record, previous node) pairs. The nodes are never modified, so
+        # copies of a board share the chain instead of copying it.
+        self._undo = None
+        
+        # Mark of the player who has m in a row, found when moves are made
+        self.winner = self.get_winner()
+
+    def _copy_state(self, new_board):
+        """Copy the shared state to a new board of the same backend."""
+        for name in BaseBoard.__slots__:
+            setattr(new_board, name, getattr(self, name))
+        new_board.moved = False
+        new_board.last_moves = copy(self.last_moves)
+        return new_board
+    
+    @property
+    def board_str(self):
+        return '\n'.join([''.join(row) for row in self._board_state]) + '\n'
+
+    @property
+    def history_moves(self):
+        """The (mark, move) of the moves made on the board, oldest first."""
+        history_moves = []
+        node = self._undo
+        while node is not None:
+            record, node = node
+            history_moves.append((record[1], record[0]))
+        history_moves.reverse()
+        return history_moves
+    
+    @classmethod
+    def from_bytes(cls, cells, height, width, m, last_moves=None, 
+                   zobrist_seed=ZOBRIST_SEED, surround_radius=1):
+        """Build a board from a flat buffer of cells, without parsing a
+        board string.
+
+        Parameters
+        ----------
+        cells : bytes-like
+            The `CELL_CODES` of the cells, row by row: byte 
+            ``i * width + j`` is cell (i, j). `to_bytes` gives this buffer.
+
+        height, width : int
+            Size of the board.
+
+        m : int
+            Number of marks in a row needed to win.
+
+        last_moves : dict (optional)
+            The last move of each player, used to find the winner.
+        """
+        cells = bytes(cells)
+        if len(cells) != height * width or max(cells, default=0) > 2:
+            raise GameError("illegal input board!")
+        board = cls.__new__(cls)
+        board.m = m
+        board.height = height
+        board.width = width
+        board.moved = False
+        board.last_moves = last_moves if last_moves else {
+            cls.PLAYER_1: None,
+            cls.PLAYER_2: None
+        }
+        board.geometry = get_geometry(height, width, m)
+        board._load_cells(cells)
+        board._init_state(zobrist_seed, surround_radius)
+        return board
+
+    @classmethod
+    def from_array(cls, array, m, last_moves=None, 
+                   zobrist_seed=ZOBRIST_SEED, surround_radius=1):
+        """Build a board from a 2-D array of marks ('-', 'O', 'X') or of 
+        their `CELL_CODES`, such as the `_board_state` of another board.
+        """
+        array = np.asarray(array)
+        if array.ndim != 2:
+            raise GameError("illegal input board!")
+        if array.dtype.kind in 'US':
+            # Unknown marks get a code which `from_bytes` rejects
+            codes = np.full(array.shape, 255, dtype=np.uint8)
+            for mark, code in CELL_CODES.items():
+                codes[array == mark] = code
+        elif array.size and (array.min() < 0 or array.max() > 2):
+            raise GameError("illegal input board!")
+        else:
+            codes = array.astype(np.uint8)
+        return cls.from_bytes(codes.tobytes(), array.shape[0], 
+                              array.shape[1], m, last_moves, 
+                              zobrist_seed, surround_radius)
+
+    @classmethod
+    def from_moves(cls, history_moves, height, width, m, 
+                   zobrist_seed=ZOBRIST_SEED, surround_radius=1):
+        """Build a board by replaying `history_moves`, a list of 
+        (mark, move), on an empty board. The moves can be taken back with
+        `pop`.
+        """
+        board = cls.from_bytes(bytes(height * width), height, width, m, 
+                               None, zobrist_seed, surround_radius)
+        for player_mark, move in history_moves:
+            board.push(move, player_mark)
+        return board
+
+    def to_bytes(self):
+        """Return the `CELL_CODES` of the cells, row by row."""
+        return bytes([CELL_CODES[self.get_mark(cell)] 
+                      for cell in self.geometry.cells])
     
     def get_mark(self, move):
-        return self._board_state[move[0], move[1]]
+        raise NotImplementedError
+
+    def _set_mark(self, move, mark):
+        raise NotImplementedError
+
+    def _load_cells(self, cells):
+        """Set the cells from a buffer of `CELL_CODES`."""
+        raise NotImplementedError
+
+    def copy(self):
+        raise NotImplementedError
+
+    def get_occupied_bits(self):
+        bits = 0
+        for cell in self.geometry.cells:
+            if self.get_mark(cell) != self.BLANK_SPACE:
+                bits |= self.geometry.bits[cell]
+        return bits
+
+    def get_stone_bits(self, player_mark):
+        """Return the mask of the stones of `player_mark`."""
+        bits = 0
+        for cell in self.geometry.mask_cells(
+                self.geometry.full_mask & ~self.empty_bits):
+            if self.get_mark(cell) == player_mark:
+                bits |= self.geometry.bits[cell]
+        return bits
+
+    def get_zobrist_hash(self):
+        """Hash the position from scratch. Moves keep `zobrist_hash` up to 
+        date, so this is only needed when a board is built.
+        """
+        stones = []
+        for cell in self.geometry.cells:
+            mark = self.get_mark(cell)
+            if mark != self.BLANK_SPACE:
+                stones.append((mark, cell))
+        return self._zobrist.hash_moves(stones)
 
     def on_the_board(self, move):
         return 0 <= move[0] < self.height and 0 <= move[1] < self.width 
 
+    def is_empty(self, move):
+        return (self.on_the_board(move) 
+                and self.empty_bits & self.geometry.bits[move] != 0)
+
     def move_is_legal(self, move):
         # Note the index starts from 0
-        return (self.on_the_board and self._board_state[
-            move[0], move[1]] == self.BLANK_SPACE and not self.moved)
+        return self.is_empty(move) and not self.moved
 
     @property
     def legal_moves(self):
-        return np.argwhere(self._board_state == self.BLANK_SPACE)
+        # The list is kept until the next move, so don't modify it
+        if self._legal_moves is None:
+            self._legal_moves = self.geometry.mask_cells(self.empty_bits)
+        return self._legal_moves
+    
+    @property
+    def n_legal_moves(self):
+        return self.n_empty
+
+    def set_surround_radius(self, radius):
+        self.surrond_radius = radius
+        self._neighbourhoods = self.geometry.neighbourhoods(radius)
+        surround_bits = 0
+        for cell in self.geometry.mask_cells(
+                self.geometry.full_mask & ~self.empty_bits):
+            surround_bits |= self._neighbourhoods[cell]
+        self.surround_bits = surround_bits & self.empty_bits
+        self._surround_moves = None
+
+    @property
+    def surround_moves(self):
+        """The empty cells within `surrond_radius` of a stone, row by row.
+
+        The list is kept until the next move, so don't modify it.
+        """
+        if self._surround_moves is None:
+            self._surround_moves = self.geometry.mask_cells(self.surround_bits)
+        return self._surround_moves
 
     def get_surround_moves(self, move):
-        legal_moves = self.legal_moves.tolist()
         moves = []
         dist = []
         for i in range(move[0] - self.surrond_radius, 
                        move[0] + self.surrond_radius + 1):
             for j in range(move[1] - self.surrond_radius, 
                            move[1] + self.surrond_radius + 1):
-                if [i, j] in legal_moves:
+                if self.is_empty((i, j)):
                     moves.append((i, j))
                     dist.append(max(abs(move[0] - i), abs(move[1] - j)))
-        return [tuple(m) for m in np.array(moves)[np.argsort(dist)]]
+        return [moves[k] for k in np.argsort(dist)]
+
+    def push(self, move, player_mark):
+        """Make a move in place. It can be taken back with `pop`.
+
+        Unlike `apply_move`, a board can be pushed any number of times, so
+        search can walk the game tree on a single board.
+        """
+        move = (int(move[0]), int(move[1]))
+        if not self.is_empty(move):
+            raise GameError('Illegal move! move: ', move)
         
-    def copy(self):
-        new_board = Board(copy(self.board_str), 
-                          copy(self.m), 
-                          copy(self.last_moves))
-        new_board.surround_moves = copy(self.surround_moves)
-        new_board.history_moves = copy(self.history_moves)
-        new_board.n_step = copy(self.n_step)
-        return new_board
+        # Make a move
+        self.n_step += 1
+        self._set_mark(move, player_mark)
+        self.empty_bits ^= self.geometry.bits[move]
+        self.n_empty -= 1
+        self._legal_moves = None
+        self.zobrist_hash ^= \
+            self._zobrist.key(move, player_mark) ^ self._zobrist.side
+        last_move = self.last_moves[player_mark]
+        self.last_moves[player_mark] = move
+        
+        # Update surround moves
+        surround_bits = self.surround_bits
+        self.surround_bits = \
+            (self.surround_bits | self._neighbourhoods[move]) & self.empty_bits
+        self._surround_moves = None
+        
+        # Add move to the history
+        self._undo = (
+            (move, player_mark, last_move, self.winner, surround_bits), 
+            self._undo)
+        
+        # Check whether the new stone completes a line
+        if self.winner is None \
+                and max(self.count_runs(move, player_mark)) >= self.m:
+            self.winner = player_mark
+
+    def pop(self):
+        """Take back the last move made by `push` and return it."""
+        if self._undo is None:
+            raise GameError('No move to take back!')
+        record, self._undo = self._undo
+        move, player_mark, last_move, self.winner, self.surround_bits = record
+        self._legal_moves = None
+        self._surround_moves = None
+        
+        self.last_moves[player_mark] = last_move
+        self._set_mark(move, self.BLANK_SPACE)
+        self.empty_bits ^= self.geometry.bits[move]
+        self.n_empty += 1
+        self.zobrist_hash ^= \
+            self._zobrist.key(move, player_mark) ^ self._zobrist.side
+        self.n_step -= 1
+        return move
 
     def apply_move(self, move, player_mark):
         if self.move_is_legal(move):
-            # Make a move
-            self.n_step += 1
-            self._board_state[move[0], move[1]] = player_mark
-            self.board_str = '\n'.join(
-                [''.join(row) for row in self._board_state]) + '\n'
-            self.last_moves[player_mark] = tuple(move)
+            self.push(move, player_mark)
             self.moved = True
-            
-            # Update surround moves
-            if move in self.surround_moves:
-                self.surround_moves.remove(move)
-            for m in self.get_surround_moves(move):
-                if m not in self.surround_moves:
-                    self.surround_moves.append(m)
-                    
-            # Add move to history_moves
-            self.history_moves.append((player_mark, move))
         else:
             raise GameError('Illegal move! move: ', move)
 
@@ -112,32 +325,36 @@ class Board(object):
         new_board.apply_move(move, player_mark)
         return new_board
     
-    def is_winner(self, player_mark):
-        if self.last_moves == {}:
-            return False
-        
-        if self.last_moves[player_mark] is None:
-            return False
-        
-        directions = (((0, 1), (0, -1)), ((1, 0), (-1, 0)),
-                    ((1, 1), (-1, -1)), ((1, -1), (-1, 1)))
-        
-        for bi_directions in directions:
+    def count_runs(self, move, player_mark):
+        """Return the lengths of the lines of `player_mark` through `move`
+        in the four directions, counting the stone at `move`.
+        """
+        rays = self.geometry.rays[move]
+        runs = []
+        for bi_directions in self.geometry.LINES:
             count = 1
-            for d_i, d_j in bi_directions:
-                i, j = self.last_moves[player_mark]
-                while True:
-                    i, j = i + d_i, j + d_j
-                    if (not self.on_the_board((i, j)) \
-                            or self._board_state[i, j] != player_mark):
+            for d in bi_directions:
+                for cell in rays[d]:
+                    if self.get_mark(cell) != player_mark:
                         break
                     count += 1
-                    if count == self.m:
-                        return True
-        return False
+            runs.append(count)
+        return runs
+
+    def get_winner(self):
+        """Find the winner by checking the lines through the last moves."""
+        for player_mark in (self.PLAYER_1, self.PLAYER_2):
+            move = self.last_moves.get(player_mark)
+            if move is not None \
+                    and max(self.count_runs(move, player_mark)) >= self.m:
+                return player_mark
+        return None
+    
+    def is_winner(self, player_mark):
+        return self.winner == player_mark
     
     def is_loser(self, player_mark):
-        return self.is_winner(get_opponent(player_mark))
+        return self.winner == get_opponent(player_mark)
     
     @property
     def board_for_print(self):
@@ -145,15 +362,253 @@ class Board(object):
         axises = list('0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ')
         out = '    ' + '   '.join(axises[:self.width]) + '\n\r'
         out += '  ' + '-' * (self.width * 4 + 1) + '\n\r'
+        state = self._board_state
         for i in range(self.height):
             out += axises[i] + ' | '
             for j in range(self.width):
-                if self._board_state[i, j] == '-':
+                if state[i, j] == '-':
                     out += ' '
                 else:
-                    out += self._board_state[i, j]
+                    out += state[i, j]
                 out += ' | '
             out += '\n\r'
             out += '  ' + '-' * (self.width * 4 + 1) + '\n\r'
 
         return out
+
+
+class Board(BaseBoard):
+    """The board of generalized TIC-TAC-TOE game.
+    """
+
+    def __init__(self, board_str, m, last_moves=None, 
+                 zobrist_seed=ZOBRIST_SEED, surround_radius=1):
+        self.m = m
+        self._board_str = board_str
+        self.moved = False
+        self.last_moves = last_moves if last_moves else {
+            self.PLAYER_1: None,
+            self.PLAYER_2: None
+        }
+        self.width = len(board_str.split('\n')[0])
+        self.height = len(board_str.split('\n')[:-1])
+        self._board_state = self.get_board_state()
+        self.geometry = get_geometry(self.height, self.width, m)
+        self._init_state(zobrist_seed, surround_radius)
+            
+    @property
+    def board_str(self):
+        # Rendered lazily, so moves made during search don't rebuild it
+        if self._board_str is None:
+            self._board_str = '\n'.join(
+                [''.join(row) for row in self._board_state]) + '\n'
+        return self._board_str
+
+    def get_board_state(self):
+        state = np.empty((self.height, self.width), dtype='str')
+        for i, row in enumerate(self.board_str.split('\n')[:-1]):
+            for j, cell in enumerate(row):
+                if cell in [self.BLANK_SPACE, self.PLAYER_1, self.PLAYER_2]:
+                    state[i, j] = cell
+                else:
+                    raise GameError("illegal input board!")
+        
+        return state
+    
+    def get_mark(self, move):
+        return self._board_state[move[0], move[1]]
+
+    def get_occupied_bits(self):
+        bits = 0
+        for i, j in np.argwhere(self._board_state != self.BLANK_SPACE):
+            bits |= self.geometry.bits[(i, j)]
+        return bits
+        
+    def copy(self):
+        # Copy the cell array directly instead of parsing a board string
+        new_board = Board.__new__(Board)
+        self._copy_state(new_board)
+        new_board._board_state = self._board_state.copy()
+        new_board._board_str = self._board_str
+        return new_board
+
+    def _set_mark(self, move, mark):
+        self._board_state[move[0], move[1]] = mark
+        self._board_str = None
+
+    def _load_cells(self, cells):
+        marks = np.array(list(CELL_MARKS), dtype='str')
+        self._board_state = marks[np.frombuffer(cells, dtype=np.uint8)] \
+            .reshape(self.height, self.width)
+        self._board_str = None
+
+
+class BitBoard(Board):
+    """Board backend keeping each player's stones in an integer bitmask.
+
+    Exposes the same interface as `Board`, so players and strategies can use
+    either one. The masks use the bit layout of `BoardGeometry.bits`, whose
+    guard column lets the win checks shift whole masks along a direction.
+    """
+
+    def __init__(self, board_str, m, last_moves=None, 
+                 zobrist_seed=ZOBRIST_SEED, surround_radius=1):
+        self.m = m
+        self.moved = False
+        self.last_moves = last_moves if last_moves else {
+            self.PLAYER_1: None,
+            self.PLAYER_2: None
+        }
+        self.width = len(board_str.split('\n')[0])
+        self.height = len(board_str.split('\n')[:-1])
+        self.geometry = get_geometry(self.height, self.width, m)
+        self.stride = self.geometry.stride
+        
+        # Shifts of the four directions: -, |, \, /
+        self.shifts = self.geometry.shifts
+        self.stones = self.get_board_bits(board_str)
+        self._init_state(zobrist_seed, surround_radius)
+
+    def get_board_bits(self, board_str):
+        stones = {self.PLAYER_1: 0, self.PLAYER_2: 0}
+        for i, row in enumerate(board_str.split('\n')[:-1]):
+            for j, cell in enumerate(row):
+                if cell in stones:
+                    stones[cell] |= self.geometry.bits[(i, j)]
+                elif cell != self.BLANK_SPACE:
+                    raise GameError("illegal input board!")
+        return stones
+
+    def get_occupied_bits(self):
+        return self.stones[self.PLAYER_1] | self.stones[self.PLAYER_2]
+    
+    def get_stone_bits(self, player_mark):
+        return self.stones[player_mark]
+
+    @property
+    def board_str(self):
+        return '\n'.join([''.join(row) for row in self._board_state]) + '\n'
+
+    @property
+    def _board_state(self):
+        state = np.full((self.height, self.width), self.BLANK_SPACE, 
+                        dtype='str')
+        for mark, bits in self.stones.items():
+            for i, j in self.geometry.mask_cells(bits):
+                state[i, j] = mark
+        return state
+
+    def get_mark(self, move):
+        bit = self.geometry.bits[move]
+        if self.stones[self.PLAYER_1] & bit:
+            return self.PLAYER_1
+        if self.stones[self.PLAYER_2] & bit:
+            return self.PLAYER_2
+        return self.BLANK_SPACE
+
+    def copy(self):
+        # Copy the bitmasks directly instead of parsing a board string
+        new_board = BitBoard.__new__(BitBoard)
+        self._copy_state(new_board)
+        new_board.__dict__.update(self.__dict__)
+        new_board.stones = copy(self.stones)
+        return new_board
+
+    def _load_cells(self, cells):
+        self.stride = self.geometry.stride
+        self.shifts = self.geometry.shifts
+        self.stones = {self.PLAYER_1: 0, self.PLAYER_2: 0}
+        for k, code in enumerate(cells):
+            if code:
+                self.stones[CELL_MARKS[code]] |= \
+                    self.geometry.bits[divmod(k, self.width)]
+
+    def _set_mark(self, move, mark):
+        bit = self.geometry.bits[move]
+        if mark == self.BLANK_SPACE:
+            self.stones[self.PLAYER_1] &= ~bit
+            self.stones[self.PLAYER_2] &= ~bit
+        else:
+            self.stones[mark] |= bit
+
+    def count_runs(self, move, player_mark):
+        bits = self.stones[player_mark]
+        index = int(move[0]) * self.stride + int(move[1])
+        runs = []
+        for shift in self.shifts:
+            count = 1
+            k = index + shift
+            while bits >> k & 1:
+                count += 1
+                k += shift
+            k = index - shift
+            while k >= 0 and bits >> k & 1:
+                count += 1
+                k -= shift
+            runs.append(count)
+        return runs
+
+
+class CompactBoard(BaseBoard):
+    """Board backend with `__slots__` and a flat buffer of cells.
+
+    Cell (i, j) is byte ``i * width + j`` of a bytearray, holding the
+    `CELL_CODES` of its mark. No string or array copy of the board is kept:
+    `board_str`, `_board_state` and `board_for_print` are rendered only when
+    asked. With the undo chain shared between copies, a position made by
+    `get_moved_board` takes a few hundred bytes, several times less than a
+    `Board`, with the same interface.
+    """
+    __slots__ = ('_cells',)
+    
+    # Translation tables between marks and codes
+    _ENCODE = str.maketrans(CELL_MARKS, '\x00\x01\x02')
+    _DECODE = bytes.maketrans(b'\x00\x01\x02', CELL_MARKS.encode())
+
+    def __init__(self, board_str, m, last_moves=None, 
+                 zobrist_seed=ZOBRIST_SEED, surround_radius=1):
+        self.m = m
+        self.moved = False
+        self.last_moves = last_moves if last_moves else {
+            self.PLAYER_1: None,
+            self.PLAYER_2: None
+        }
+        rows = board_str.split('\n')[:-1]
+        self.width = len(board_str.split('\n')[0])
+        self.height = len(rows)
+        cells = ''.join(rows)
+        if len(cells) != self.height * self.width \
+                or not set(cells) <= set(CELL_MARKS):
+            raise GameError("illegal input board!")
+        self._cells = bytearray(cells.translate(self._ENCODE), 'ascii')
+        self.geometry = get_geometry(self.height, self.width, m)
+        self._init_state(zobrist_seed, surround_radius)
+
+    @property
+    def board_str(self):
+        marks = self._cells.translate(self._DECODE).decode()
+        return ''.join([marks[i:i + self.width] + '\n' 
+                        for i in range(0, len(marks), self.width)])
+
+    @property
+    def _board_state(self):
+        return np.array([list(row) for row in self.board_str.split()], 
+                        dtype='str').reshape(self.height, self.width)
+
+    def get_mark(self, move):
+        return CELL_MARKS[self._cells[move[0] * self.width + move[1]]]
+
+    def _set_mark(self, move, mark):
+        self._cells[move[0] * self.width + move[1]] = CELL_CODES[mark]
+
+    def _load_cells(self, cells):
+        self._cells = bytearray(cells)
+
+    def to_bytes(self):
+        return bytes(self._cells)
+
+    def copy(self):
+        new_board = CompactBoard.__new__(CompactBoard)
+        self._copy_state(new_board)
+        new_board._cells = bytearray(self._cells)
+        return new_board
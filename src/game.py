@@ -1,10 +1,11 @@
-import timeit
 import numpy as numpy
 
-from board import Board, GameError
+from board import Board, BitBoard, GameError
 
 from players.players import HumanPlayer
 from players.minimax import *
+from players.ponder import Ponderer
+from players.timing import TimeManager
 
 from strategies.scores import *
 from strategies.get_initial_moves import *
@@ -14,15 +15,17 @@ from strategies.get_limited_moves import *
 TIME_LIMIT_MILLIS = 15000
 
 
-def play_game(player_1, player_2, board_size, m, time_limit=TIME_LIMIT_MILLIS):
+def play_game(player_1, player_2, board_size, m, time_limit=TIME_LIMIT_MILLIS,
+              board_class=Board, ponder=False, game_time=None):
 
     # Initialize a game board
-    init_board = ('-' * board_size[1] + '\n') * board_size[0]
-    gameBoard = Board(init_board, m)
+    gameBoard = board_class.from_moves([], board_size[0], board_size[1], m)
     print(gameBoard.board_for_print)
 
-    # Set the timer
-    time_millis = lambda: 1000 * timeit.default_timer()
+    # Set the clocks: each move gets at most time_limit, and a share of
+    # game_time if the players have a time budget for the game
+    clocks = (TimeManager(time_limit, game_time),
+              TimeManager(time_limit, game_time))
 
     # Two players
     players = ((player_1, 'O'), (player_2, 'X'))
@@ -30,11 +33,17 @@ def play_game(player_1, player_2, board_size, m, time_limit=TIME_LIMIT_MILLIS):
     # Assign mark to players
     player_1.assign_player_mark(players[0][1])
     player_2.assign_player_mark(players[1][1])
+    player_1.new_game()
+    player_2.new_game()
+
+    # With pondering, each player thinks during the other's turn, which
+    # takes CPU time from the other's search
+    ponderers = (Ponderer(player_1), Ponderer(player_2)) if ponder else None
     player_idx = 1
     player_mark = 'X' 
     
     while not gameBoard.is_winner(player_mark) \
-            and len(gameBoard.legal_moves) != 0:
+            and gameBoard.n_legal_moves != 0:
 
         print('-' * 70)
         player_idx = player_idx ^ 1
@@ -44,11 +53,16 @@ def play_game(player_1, player_2, board_size, m, time_limit=TIME_LIMIT_MILLIS):
         while True:
             try:
                 # Set the timeer
-                move_start = time_millis()
-                time_left = lambda : time_limit - (time_millis() - move_start)
+                time_left = clocks[player_idx].start_move(gameBoard)
                 
                 # Get a move from player
-                move = players[player_idx][0].get_move(gameBoard, time_left)
+                if ponderers:
+                    move = ponderers[player_idx].get_move(
+                        gameBoard, time_left)
+                else:
+                    move = players[player_idx][0].get_move(
+                        gameBoard, time_left)
+                move_time = clocks[player_idx].stop_move()
                 
                 # Generate a new board
                 gameBoard = gameBoard.get_moved_board(move, player_mark)
@@ -57,8 +71,14 @@ def play_game(player_1, player_2, board_size, m, time_limit=TIME_LIMIT_MILLIS):
                 print('Step: ', gameBoard.n_step)
                 print('Move: ', move, '\'' + player_mark + '\'')
                 print('Last Move: ', gameBoard.last_moves[player_mark])
+                print('Time: {:.0f} ms of {:.0f} ms'.format(
+                    move_time, clocks[player_idx].budget))
                 print(gameBoard.board_for_print)
                 
+                if ponderers and not gameBoard.is_winner(player_mark) \
+                        and gameBoard.n_legal_moves != 0:
+                    ponderers[player_idx].start(gameBoard)
+                
                 break
             
             except GameError as e:
@@ -67,6 +87,9 @@ def play_game(player_1, player_2, board_size, m, time_limit=TIME_LIMIT_MILLIS):
                 print('Do it again!')
 
     # Game over
+    if ponderers:
+        for ponderer in ponderers:
+            ponderer.stop()
     print('=' * 70)
     if gameBoard.is_winner('O'):
         print('The winner is Player \'O\'!') 
@@ -136,4 +159,4 @@ if __name__ == '__main__':
     # P_8.dqn.store_memory()
 
     # Play the game
-    play_game(P_4, P_5, board_size_, m_, time_limit_)
+    play_game(P_4, P_5, board_size_, m_, time_limit_, board_class=BitBoard)
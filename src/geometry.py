@@ -0,0 +1,133 @@
+class BoardGeometry(object):
+    """Index tables of a board size, built once and shared by all boards.
+
+    Parameters
+    ----------
+    height, width : int
+        Size of the board.
+
+    m : int
+        Number of marks in a row needed to win.
+
+    Attributes
+    ----------
+    cells : list of (int, int)
+        All the cells, row by row.
+
+    rays : dict
+        rays[(i, j)][d] is the tuple of cells from (i, j) to the edge of the
+        board in direction `DIRECTIONS[d]`, nearest first, without (i, j).
+
+    windows : list of tuple
+        Every line of m cells on the board.
+
+    cell_windows : dict
+        cell_windows[(i, j)] is the list of indices of the windows through
+        (i, j).
+
+    window_bits : list of int
+        The cell mask of each window.
+
+    bits : dict
+        bits[(i, j)] is the bit of (i, j) in a cell mask, which is
+        ``1 << (i * stride + j)``. The extra column at the end of every row
+        is never set, so shifting a mask by one of `shifts` can not carry a
+        line over the edge of the board.
+
+    full_mask : int
+        The mask of all the cells.
+    """
+
+    # The 8 directions, clockwise from up
+    DIRECTIONS = ((-1, 0), (-1, 1), (0, 1), (1, 1),
+                  (1, 0), (1, -1), (0, -1), (-1, -1))
+
+    # Pairs of opposite directions making the four lines: |, /, -, \
+    LINES = ((0, 4), (1, 5), (2, 6), (3, 7))
+
+    def __init__(self, height, width, m):
+        self.height = height
+        self.width = width
+        self.m = m
+        self.cells = [(i, j) for i in range(height) for j in range(width)]
+        
+        # Bit masks of cells
+        self.stride = width + 1
+        self.shifts = (1, self.stride, self.stride + 1, self.stride - 1)
+        self.bits = {(i, j): 1 << (i * self.stride + j) 
+                     for i, j in self.cells}
+        self.full_mask = sum(self.bits.values())
+        self._neighbourhoods = {}
+        
+        self.rays = self.get_rays()
+        self.windows, self.cell_windows = self.get_windows()
+        self.window_bits = [sum(self.bits[c] for c in window)
+                            for window in self.windows]
+
+    def on_the_board(self, i, j):
+        return 0 <= i < self.height and 0 <= j < self.width
+
+    def mask_cells(self, mask):
+        """List the cells of a mask, row by row."""
+        cells = []
+        while mask:
+            low = mask & -mask
+            cells.append(divmod(low.bit_length() - 1, self.stride))
+            mask ^= low
+        return cells
+
+    def neighbourhoods(self, radius):
+        """Return the masks of the cells within `radius` (in Chebyshev 
+        distance) of each cell, the cell itself included.
+        """
+        if radius not in self._neighbourhoods:
+            masks = {}
+            for i, j in self.cells:
+                mask = 0
+                for n_i in range(max(i - radius, 0), 
+                                 min(i + radius + 1, self.height)):
+                    for n_j in range(max(j - radius, 0), 
+                                     min(j + radius + 1, self.width)):
+                        mask |= self.bits[(n_i, n_j)]
+                masks[(i, j)] = mask
+            self._neighbourhoods[radius] = masks
+        return self._neighbourhoods[radius]
+
+    def get_rays(self):
+        rays = {}
+        for cell in self.cells:
+            cell_rays = []
+            for d_i, d_j in self.DIRECTIONS:
+                ray = []
+                i, j = cell[0] + d_i, cell[1] + d_j
+                while self.on_the_board(i, j):
+                    ray.append((i, j))
+                    i, j = i + d_i, j + d_j
+                cell_rays.append(tuple(ray))
+            rays[cell] = tuple(cell_rays)
+        return rays
+
+    def get_windows(self):
+        windows = []
+        cell_windows = {cell: [] for cell in self.cells}
+        # Windows start at a cell and run along the second direction of
+        # each line, so every window is listed once
+        for cell in self.cells:
+            for _, d in self.LINES:
+                ray = self.rays[cell][d]
+                if len(ray) >= self.m - 1:
+                    window = (cell,) + ray[:self.m - 1]
+                    for c in window:
+                        cell_windows[c].append(len(windows))
+                    windows.append(window)
+        return windows, cell_windows
+
+
+_geometries = {}
+
+
+def get_geometry(height, width, m):
+    """Return the (shared) `BoardGeometry` of a board size and m."""
+    if (height, width, m) not in _geometries:
+        _geometries[(height, width, m)] = BoardGeometry(height, width, m)
+    return _geometries[(height, width, m)]
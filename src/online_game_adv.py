@@ -1,12 +1,13 @@
-import timeit
 import time
 import json
 import requests
 
-from board import Board, GameError
+from board import Board, BitBoard, GameError
 
 from players.players import HumanPlayer
 from players.minimax import *
+from players.ponder import Ponderer
+from players.timing import TimeManager
 
 from strategies.scores import *
 from strategies.get_initial_moves import *
@@ -28,7 +29,10 @@ class OnlineGame(object):
                  api_url,
                  headers,
                  time_interval=3,
-                 time_limit=300000):
+                 time_limit=300000,
+                 board_class=Board,
+                 ponder=False,
+                 game_time=None):
         self.board_size = board_size
         self.m = m
         self.player_mark = player_mark
@@ -39,6 +43,9 @@ class OnlineGame(object):
         self.headers = headers
         self.time_interval = time_interval
         self.time_limit = time_limit
+        self.board_class = board_class
+        self.ponder = ponder
+        self.game_time = game_time
     
     def get_opponent(self, player_mark):
         if player_mark == self.PLAYER_1:
@@ -141,7 +148,7 @@ class OnlineGame(object):
             print('=' * 70)
             print('The winner is Player \'X\'!') 
             return True
-        elif len(board.legal_moves) == 0:
+        elif board.n_legal_moves == 0:
             print('=' * 70)
             print('Game over! No winner!') 
             return True
@@ -150,13 +157,18 @@ class OnlineGame(object):
         
     def play_game(self, player):
         
-        # Set the timer
-        time_millis = lambda: 1000 * timeit.default_timer()
+        # Set the clock: each move gets at most time_limit, and a share of
+        # game_time if there is a time budget for the game
+        clock = TimeManager(self.time_limit, self.game_time)
         player.assign_player_mark(self.player_mark)
+        player.new_game()
+
+        # Think in the background while waiting for the opponent's move
+        ponderer = Ponderer(player) if self.ponder else None
         
         # Initialize a new board
-        init_board = ('-' * self.board_size[1] + '\n') * self.board_size[0]
-        gameBoard = Board(init_board, self.m)
+        gameBoard = self.board_class.from_moves(
+            [], self.board_size[0], self.board_size[1], self.m)
         print(gameBoard.board_for_print)
         
         try:
@@ -166,16 +178,20 @@ class OnlineGame(object):
             
             # If game is not over, do moves
             while not self.game_is_over(gameBoard):
-                move_start = time_millis()
-                time_left = \
-                    lambda : self.time_limit - (time_millis() - move_start)
+                time_left = clock.start_move(gameBoard)
                 
                 # get a move
-                move = player.get_move(gameBoard, time_left)
+                if ponderer:
+                    move = ponderer.get_move(gameBoard, time_left)
+                else:
+                    move = player.get_move(gameBoard, time_left)
+                move_time = clock.stop_move()
                 gameBoard = gameBoard.get_moved_board(move, self.player_mark)
                 print('-' * 70)
                 print('Step: ', gameBoard.n_step)
                 print('My Move ({}):'.format(self.player_mark), move)
+                print('Time: {:.0f} ms of {:.0f} ms'.format(
+                    move_time, clock.budget))
                 print(gameBoard.board_for_print)
                 
                 # post to server
@@ -186,6 +202,8 @@ class OnlineGame(object):
                     break
                 
                 # Get the move of opponents
+                if ponderer:
+                    ponderer.start(gameBoard)
                 gameBoard = self.get_opponent_moved_board(gameBoard)
                 
         except GameError as e:
@@ -193,6 +211,9 @@ class OnlineGame(object):
             print('Game over!', e)
             if not self.game_is_over(gameBoard):
                 print(gameBoard.board_for_print)
+        finally:
+            if ponderer:
+                ponderer.stop()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,433 @@
+import math
+import random
+import time
+
+from strategies.get_initial_moves import null_im
+from strategies.get_limited_moves import advanced_lm
+
+from players.players import Player
+from players.threats import ThreatSpaceSolver
+from utils import get_opponent
+
+
+class Node(object):
+    """Node of the search tree: the position after `move` of `mark`.
+
+    `wins` counts the playouts through the node won by `mark`, a draw
+    counting half. `children` is None until the node is expanded, and
+    `winner` is the mark of the player with m in a row, if any. `scored`
+    tells whether the priors of the children come from the score function.
+    """
+    __slots__ = ('move', 'mark', 'parent', 'key', 'winner', 'prior',
+                 'children', 'visits', 'wins', 'scored')
+
+    def __init__(self, move, mark, parent, key, winner=None, prior=1.):
+        self.move = move
+        self.mark = mark
+        self.parent = parent
+        self.key = key
+        self.winner = winner
+        self.prior = prior
+        self.children = None
+        self.visits = 0
+        self.wins = 0.
+        self.scored = False
+
+
+class MCTSPlayer(Player):
+    """Game-playing agent that chooses a move by Monte Carlo tree search.
+
+    Each iteration walks down the tree to a leaf, expands it, plays the
+    game out to the end from there, and counts the result in the nodes
+    walked through. The tree is kept between moves: the next search starts
+    from the node of the opponent's reply, with the playouts already made
+    below it.
+
+    Playouts don't use the board class. The stones of each player are cell
+    masks (see `BoardGeometry.bits`), and a move only checks the lines
+    through its cell.
+
+    Parameters
+    ----------
+    score_fn : strategies.scores.Score (optional)
+        Heuristic giving the priors of the moves, e.g. `AdvancedScore`.
+        Moves are ranked by the score of the board after them, and the
+        move of rank k gets a prior proportional to 1 / (k + 1). Selection
+        is PUCT with priors, and UCT without. Scoring every child is much
+        slower than a playout, so the children of a node are first ranked
+        in the order of `limited_moves_fn`, and only scored once the node
+        has `prior_visits` visits.
+
+    initial_moves_fn : callable (optional)
+        Opening move strategy, as for `MinimaxPlayer`.
+
+    limited_moves_fn : callable (optional)
+        Moves of a tree node, as (board, player_mark) -> list of moves. A
+        node where a player can win, or has to block a win, only gets
+        those moves.
+
+    timeout : float (optional)
+        Time (in milliseconds) left on the timer when the search stops.
+
+    exploration : float (optional)
+        Exploration constant of UCT or PUCT.
+
+    playout_policy : str (optional)
+        'random' plays random empty cells. 'pattern' completes a line when
+        it can, else blocks the opponent's, else plays next to the last
+        move.
+
+    max_playouts : int (optional)
+        Maximum number of playouts per move, if not None.
+
+    prior_visits : int (optional)
+        Visits of a node before the priors of its children are computed
+        with `score_fn`.
+
+    verbose : bool (optional)
+        Print the playouts of each search.
+
+    reuse_tree : bool (optional)
+        Keep the subtree of the position reached between moves.
+
+    seed : int (optional)
+        Seed of the random generator of the playouts.
+
+    Attributes
+    ----------
+    root : Node
+        The node of the last position searched.
+
+    n_playouts : int
+        Number of playouts made by the last search.
+
+    playouts_per_sec : float
+        Playout throughput of the last search.
+    """
+
+    def __init__(self,
+                 score_fn=None,
+                 initial_moves_fn=null_im,
+                 limited_moves_fn=advanced_lm,
+                 timeout=10.,
+                 exploration=1.4,
+                 playout_policy='pattern',
+                 max_playouts=None,
+                 reuse_tree=True,
+                 seed=None,
+                 prior_visits=8,
+                 verbose=False):
+        super(MCTSPlayer, self).__init__()
+        if playout_policy not in ('random', 'pattern'):
+            raise ValueError(
+                'Unknown playout policy: {}'.format(playout_policy))
+        self.score_fn = score_fn
+        self.initial_moves_fn = initial_moves_fn
+        self.limited_moves_fn = limited_moves_fn
+        self.timer_threshold = timeout
+        self.exploration = exploration
+        self.playout_policy = playout_policy
+        self.max_playouts = max_playouts
+        self.prior_visits = prior_visits
+        self.verbose = verbose
+        self.reuse_tree = reuse_tree
+        self.random = random.Random(seed)
+        self.root = None
+        self.n_playouts = 0
+        self.playouts_per_sec = 0.
+
+    def get_move(self, board, time_left):
+        """Search for the best move from the available legal moves and return a
+        result before the time limit expires.
+
+        Parameters
+        ----------
+        board : board.Board
+            An instance of the generalized TIC-TAC-TOE board `Board` class
+            representing the current board state
+
+        time_left : callable
+            A function that returns the number of milliseconds left in the
+            current turn. Returning with any less than 0 ms remaining forfeits
+            the game.
+
+        Returns
+        -------
+        (int, int)
+            Board coordinates corresponding to a legal move; may return
+            (-1, -1) if there are no available legal moves.
+        """
+        initial_move = self.initial_moves_fn(board)
+        if initial_move:
+            return initial_move
+
+        root = self.set_root(board)
+        reused = root.visits
+        if root.children is None:
+            self._expand(board, root)
+        self._score_children(board, root, time_left)
+
+        start = time.time()
+        n_playouts = 0
+        # Time (in milliseconds) of the longest playout so far, kept free
+        # at the end so the last one doesn't overrun
+        margin = 0.
+        while (self.max_playouts is None or n_playouts < self.max_playouts) \
+                and time_left() >= self.timer_threshold + margin:
+            playout_start = time.time()
+            self.run_playout(board, time_left)
+            margin = max(margin, 1000. * (time.time() - playout_start))
+            n_playouts += 1
+        self.n_playouts = n_playouts
+        self.playouts_per_sec = n_playouts / max(time.time() - start, 1e-9)
+        if self.verbose:
+            print('MCTS: {} playouts ({:.0f}/s), {} reused'.format(
+                n_playouts, self.playouts_per_sec, reused))
+
+        if not root.children:
+            return (-1, -1)
+        # The most visited move, won moves first
+        best = max(root.children,
+                   key=lambda c: (c.winner == c.mark, c.visits))
+        return best.move
+
+    def new_game(self):
+        self.root = None
+
+    def ponder(self, board, time_left):
+        """Grow the tree of `board`, the opponent to move, until
+        `time_left` runs out.
+        """
+        root = self.set_root(board, self.player_mark)
+        if root.children is None:
+            self._expand(board, root)
+        while root.children and time_left() >= self.timer_threshold:
+            self.run_playout(board, time_left)
+
+    def set_root(self, board, last_mark=None):
+        """Move the root to the node of `board`, among the children and
+        grandchildren of the last root, or start a new tree if it isn't
+        there. `last_mark` is the mark of the player who moved last, by
+        default the opponent.
+        """
+        key = board.zobrist_hash
+        if self.reuse_tree and self.root is not None:
+            if self.root.key == key:
+                return self.root
+            for child in self.root.children or ():
+                if child.key == key:
+                    child.parent = None
+                    self.root = child
+                    return child
+                for grandchild in child.children or ():
+                    if grandchild.key == key:
+                        grandchild.parent = None
+                        self.root = grandchild
+                        return grandchild
+        self.root = Node(None, last_mark or self.opponent_mark, None, key)
+        return self.root
+
+    def run_playout(self, board, time_left=None):
+        """Run one iteration of the search from the root, on `board`, the
+        position of the root. The priors of a node aren't computed when
+        `time_left` runs out.
+        """
+        node = self.root
+        n_pushed = 0
+        try:
+            # Selection
+            while node.children:
+                if not node.scored and node.visits >= self.prior_visits:
+                    self._score_children(board, node, time_left)
+                node = self._select(node)
+                board.push(node.move, node.mark)
+                n_pushed += 1
+
+            # Expansion
+            if node.winner is None and node.children is None:
+                self._expand(board, node)
+                if node.children:
+                    node = self._select(node)
+                    board.push(node.move, node.mark)
+                    n_pushed += 1
+
+            # Playout
+            if node.winner is not None:
+                winner = node.winner
+            elif node.children is not None:
+                # No moves left: a draw
+                winner = None
+            else:
+                winner = self.playout(board, get_opponent(node.mark))
+        finally:
+            for _ in range(n_pushed):
+                board.pop()
+
+        # Backpropagation
+        while node is not None:
+            node.visits += 1
+            if winner is None:
+                node.wins += 0.5
+            elif winner == node.mark:
+                node.wins += 1.
+            node = node.parent
+
+    def _select(self, node):
+        """Return the child of `node` with the best UCT (or PUCT) value."""
+        c = self.exploration
+        best = None
+        best_value = float("-inf")
+        if self.score_fn is None:
+            log_n = math.log(max(node.visits, 1))
+            for child in node.children:
+                if child.visits == 0:
+                    return child
+                value = child.wins / child.visits \
+                    + c * math.sqrt(log_n / child.visits)
+                if value > best_value:
+                    best, best_value = child, value
+        else:
+            # At least 1, so the priors rank the children of an unvisited
+            # node instead of all of them scoring 0
+            sqrt_n = math.sqrt(max(node.visits, 1))
+            for child in node.children:
+                q = child.wins / child.visits if child.visits else 0.
+                value = q + c * child.prior * sqrt_n / (1 + child.visits)
+                if value > best_value:
+                    best, best_value = child, value
+        return best
+
+    def _expand(self, board, node):
+        player_mark = get_opponent(node.mark)
+        children = []
+        for move in self._get_moves(board, player_mark):
+            board.push(move, player_mark)
+            try:
+                children.append(Node(move, player_mark, node,
+                                     board.zobrist_hash, board.winner))
+            finally:
+                board.pop()
+        node.children = children
+        # Until the children are scored, rank them in the order of the
+        # moves, nearest to the last moves first
+        self._set_priors(children, range(len(children)))
+
+    def _score_children(self, board, node, time_left=None):
+        """Set the priors of the children of `node`, on `board`, from the
+        ranks of their scores. Gives up, to try again later, if `time_left`
+        runs out.
+        """
+        if self.score_fn is None or node.scored or not node.children:
+            return
+        scores = []
+        for child in node.children:
+            if time_left is not None \
+                    and time_left() < self.timer_threshold:
+                return
+            board.push(child.move, child.mark)
+            try:
+                scores.append(self.score_fn.get_score(board, child.mark))
+            finally:
+                board.pop()
+        # Priors from the ranks of the scores, as the scale of the scores
+        # varies a lot between positions
+        self._set_priors(node.children,
+                         sorted(range(len(scores)), key=lambda k: -scores[k]))
+        node.scored = True
+
+    @staticmethod
+    def _set_priors(children, order):
+        """Give the child of rank k in `order` a prior proportional to
+        1 / (k + 1).
+        """
+        total = sum(1. / (rank + 1) for rank in range(len(children)))
+        for rank, k in enumerate(order):
+            children[k].prior = 1. / (rank + 1) / total
+
+    def _get_moves(self, board, player_mark):
+        bits = board.get_stone_bits(player_mark)
+        opp_bits = board.get_stone_bits(get_opponent(player_mark))
+        wins = ThreatSpaceSolver.fours(board, bits, opp_bits)
+        if wins:
+            return board.geometry.mask_cells(wins)[:1]
+        threats = ThreatSpaceSolver.fours(board, opp_bits, bits)
+        if threats:
+            return board.geometry.mask_cells(threats)
+        return list(self.limited_moves_fn(board, player_mark)) \
+            or board.legal_moves
+
+    def playout(self, board, player_mark):
+        """Play the game out from `board`, `player_mark` to move, following
+        `playout_policy`.
+
+        Returns
+        -------
+        str or None
+            The mark of the winner, or None for a draw.
+        """
+        geometry = board.geometry
+        cell_bits = geometry.bits
+        window_bits = geometry.window_bits
+        cell_windows = geometry.cell_windows
+        m = board.m
+        pattern = self.playout_policy == 'pattern'
+        near = geometry.neighbourhoods(1)
+        choice = self.random.choice
+
+        marks = (player_mark, get_opponent(player_mark))
+        stones = [board.get_stone_bits(mark) for mark in marks]
+        empty = board.empty_bits
+        # Cells the players complete a line at
+        fours = [ThreatSpaceSolver.fours(board, stones[0], stones[1]),
+                 ThreatSpaceSolver.fours(board, stones[1], stones[0])] \
+            if pattern else None
+        cells = geometry.mask_cells(empty)
+        self.random.shuffle(cells)
+        k = 0
+        last = board.last_moves[marks[1]]
+        turn = 0
+
+        while empty:
+            move = None
+            if pattern:
+                if fours[turn]:
+                    return marks[turn]
+                if fours[1 - turn]:
+                    move = geometry.mask_cells(fours[1 - turn])[0]
+                elif last is not None and near[last] & empty:
+                    move = choice(geometry.mask_cells(near[last] & empty))
+            if move is None:
+                # The next cell of the shuffled list still empty
+                while not empty & cell_bits[cells[k]]:
+                    k += 1
+                move = cells[k]
+
+            bit = cell_bits[move]
+            empty ^= bit
+            stones[turn] |= bit
+            mine, theirs = stones[turn], stones[1 - turn]
+            for w in cell_windows[move]:
+                mask = window_bits[w]
+                if mask & theirs:
+                    continue
+                count = bin(mask & mine).count('1')
+                if count == m:
+                    return marks[turn]
+                if pattern and count == m - 1:
+                    fours[turn] |= mask & ~mine
+            if pattern:
+                fours[1 - turn] &= ~bit
+            last = move
+            turn ^= 1
+        return None
+
+    def benchmark(self, board, player_mark, seconds=1.):
+        """Return the number of playouts per second from `board`,
+        `player_mark` to move, over `seconds` of playouts.
+        """
+        n_playouts = 0
+        start = time.time()
+        while time.time() - start < seconds:
+            self.playout(board, player_mark)
+            n_playouts += 1
+        return n_playouts / (time.time() - start)
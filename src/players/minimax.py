@@ -1,18 +1,33 @@
+import math
+import time
+import timeit
+import random
 import numpy as np
+from copy import copy
 import pandas as pd
 
-from utils import print_time
-
 from strategies.scores import NullScore
 from strategies.get_initial_moves import null_im
 from strategies.get_limited_moves import null_lm
 
-from players.players import Player, SearchTimeout, WinInAMove
+from players.players import Player, SearchTimeout
+from players.transposition import TranspositionTable, EXACT, LOWER, UPPER
+from players.ordering import KillerHistoryOrdering, tt_move_first
+from players.parallel import LazySMP, RootSplit
+from players.stats import SearchStats
+from players.timing import IterationTimer
 
 
 class MinimaxPlayer(Player):
     """Class for minimax agents.
 
+    The search is a negamax kernel shared with `AlphaBetaPlayer`: a node
+    scores its children from the view of the player to move there, and
+    takes the best of their negated scores. The kernel calls hook methods
+    for transposition-table probing, move ordering, cutoffs, extensions
+    and reductions, which do nothing here, so an engine only overrides the
+    hooks it uses.
+
     Parameters
     ----------
     score_fn : callable (optional)
@@ -22,14 +37,72 @@ class MinimaxPlayer(Player):
         Time remaining (in milliseconds) when search is aborted. Should be a
         positive value large enough to allow the function to return before the
         timer expires.
+
+    verbose : bool (optional)
+        Print the progress of the search: the depths started or skipped,
+        the scores of the root moves, forced moves and timeouts.
+
+    threat_solver : players.threats.ThreatSpaceSolver (optional)
+        Solver asked for a forced win or defence before each search. A move
+        it finds is played without searching, and when several moves stop
+        a forced win of the opponent, the search only considers them.
+
+    check_every : int (optional)
+        Number of nodes searched between two reads of the timer. The timer
+        is read more often when the time left is short for the nodes per
+        second the search makes.
+
+    print_stats : bool (optional)
+        Print the stats of each search when it ends.
+
+    tracer : players.trace.SearchTracer (optional)
+        Tracer writing a record of each search and each depth it completes.
+
+    seed : int (optional)
+        Seed of the random moves played when the search finds no best
+        move. Without one, they come from `np.random`.
+
+    Attributes
+    ----------
+    pv : list of (int, int)
+        The principal variation found by the last completed depth: the best
+        move and the best replies expected after it.
+
+    best_score : float
+        The score of the best move of the last completed depth.
+
+    nodes : int
+        Number of nodes searched by the last search.
+
+    evaluations : int
+        Number of positions the last search scored with `score_fn`.
+
+    timed_out : bool
+        Whether the last search ran out of time in the middle of a depth.
+
+    search_stats : players.stats.SearchStats
+        The stats of the last search; None if the last move was played
+        without searching.
+
+    iteration_timer : players.timing.IterationTimer
+        The times of the depths of the last search. A depth predicted to
+        take longer than the time left isn't started.
     """
 
+    # Whether the kernel narrows the window and cuts off with it
+    prune = False
+
     def __init__(self, 
                  score_fn=NullScore(),
                  initial_moves_fn = null_im,
                  limited_moves_fn = null_lm,
                  timeout=10.,
-                 verbose=False):
+                 verbose=False,
+                 threat_solver=None,
+                 check_every=256,
+                 print_stats=False,
+                 tracer=None,
+                 seed=None):
         self.score_fn = score_fn
         self.initial_moves_fn = initial_moves_fn
         self.limited_moves_fn = limited_moves_fn
@@ -38,6 +111,46 @@ class MinimaxPlayer(Player):
         self.player_mark = None
         self.verbose = verbose
         self.now_search_depth = 1
+        self.pv = []
+        self.best_score = None
+        self.threat_solver = threat_solver
+        self.check_every = check_every
+        self.print_stats = print_stats
+        self.tracer = tracer
+        self.random_state = np.random.RandomState(seed) \
+            if seed is not None else None
+        self.nodes = 0
+        self.evaluations = 0
+        self.timed_out = False
+        self.search_stats = None
+        self._search_start = None
+        self.iteration_timer = IterationTimer()
+
+        # The timer is read when the node counter reaches _next_check;
+        # _last_check is (nodes, seconds) at the last read
+        self._next_check = 0
+        self._last_check = None
+
+        # Search context kept between the moves of a game: the deepest
+        # depth completed by the last search, and (player_mark, n_step) of
+        # the position it searched
+        self.completed_depth = 0
+        self._last_search = None
+
+        # Root moves the search is restricted to, if not None
+        self._root_moves = None
+
+        # _pv[ply] is the principal variation of the node being searched at
+        # ply
+        self._pv = {}
+
+    def __getstate__(self):
+        # The timer is a closure of the game loop, which can't be pickled.
+        # Copies searching in other processes set their own.
+        state = self.__dict__.copy()
+        state['time_left'] = None
+        state['tracer'] = None
+        return state
 
     def get_move(self, board, time_left):
         """Search for the best move from the available legal moves and return a
@@ -60,35 +173,45 @@ class MinimaxPlayer(Player):
             Board coordinates corresponding to a legal move; may return
             (-1, -1) if there are no available legal moves.
         """
+        self.search_stats = None
         initial_move = self.initial_moves_fn(board)
         if initial_move:
             return initial_move
+
+        forced_move = self.get_forced_move(board, time_left)
+        if forced_move is not None:
+            return forced_move
         
         self.time_left = time_left
 
         # Initialize the best move so that this function returns something
         # in case the search fails due to timeout
-        best_move = (-1, -1)
+        search_depth, best_move = self.resume_context(board)
+        self.start_clock(board)
 
         try:
-            search_depth = 1
-            while search_depth <= len(board.legal_moves):
+            while search_depth <= board.n_legal_moves \
+                    and self.can_start_depth(search_depth):
                 self.now_search_depth = search_depth
                 if self.verbose:
                     print('-' * 35)
-                print('Now searching depth:', search_depth)
+                    print('Now searching depth:', search_depth)
                 best_move = self.minimax(board, search_depth)
+                self.complete_depth(board, search_depth)
                 search_depth += 1
         except SearchTimeout:
-            print('[W] Search timeout!')
+            if self.verbose:
+                print('[W] Search timeout!')
+            self.timed_out = True
+        finally:
+            self.finish_search(board, best_move)
             
         if best_move == (-1, -1):
-            print('Randomly get a best_move')
-            best_move = \
-                board.legal_moves[np.random.choice(len(board.legal_moves))]
+            if self.verbose:
+                print('Randomly get a best_move')
+            best_move = self.random_move(board.legal_moves)
         return best_move
     
-    @print_time
     def minimax(self, board, depth):
         """Depth-limited minimax search algorithm.
 
@@ -108,33 +231,66 @@ class MinimaxPlayer(Player):
             The board coordinates of the best move found in the current search;
             (-1, -1) if there are no legal moves
         """
+        return self.search_root(board, depth)
+
+    def search_root(self, board, depth, alpha=float("-inf"),
+                    beta=float("inf"), candidate_moves=None):
+        """Search the moves of the player at the root and return the best
+        one. Its score is kept in `best_score` and the principal variation
+        in `pv`.
+
+        `candidate_moves` restricts the search to some root moves, in that
+        order. By default, the moves of `limited_moves_fn` are searched.
+        """
         if self.time_left() < self.timer_threshold:
             raise SearchTimeout()
 
         best_score = float("-inf")
         best_move = (-1, -1)
+        alpha_orig = alpha
+        pv = []
+        self._pv = {}
 
-        scores = board._board_state.tolist()
-        
-        candidate_moves = self.limited_moves_fn(board, self.player_mark)
-        for m in candidate_moves:
+        # Scores of the root moves, printed with verbose
+        scores = board._board_state.tolist() if self.verbose else None
+
+        if candidate_moves is None:
+            candidate_moves = self._root_candidates(board)
+        for k, m in enumerate(candidate_moves):
+            board.push(m, self.player_mark)
             try:
-                moved_board = board.get_moved_board(m, self.player_mark)
-                v = self.min_value(moved_board, depth - 1)
+                if board.is_winner(self.player_mark):
+                    if self.verbose:
+                        print('It\'s time to win!', self.now_search_depth,
+                              depth - 1)
+                    best_score = float("inf")
+                    best_move = m
+                    pv = [m]
+                    break
+                v = -self._search_child(board, m, k, -beta, -alpha,
+                                        depth, 0, self.player_mark)
+            finally:
+                board.pop()
 
-                # Print information
-                if self.verbose:
-                    if -100000. < v < 100000.:
-                        scores[m[0]][m[1]] = '{:.2f}'.format(v)
-                    else:
-                        scores[m[0]][m[1]] = '{:.2E}'.format(v)
+            # Print information
+            if self.verbose:
+                if -100000. < v < 100000.:
+                    scores[m[0]][m[1]] = '{:.2f}'.format(v)
+                else:
+                    scores[m[0]][m[1]] = '{:.2E}'.format(v)
                 
-                if v > best_score:
-                    best_score = v
-                    best_move = m
-            except WinInAMove:
+            if v > best_score:
+                best_score = v
                 best_move = m
-                break
+                pv = [m] + self._pv.get(1, [])
+            if self.prune:
+                if v >= beta:
+                    break
+                alpha = max(alpha, v)
+
+        if best_move != (-1, -1):
+            self._store_tt(board, alpha_orig, beta, depth, best_score,
+                           best_move)
         
         # Print information
         if self.verbose:
@@ -144,66 +300,394 @@ class MinimaxPlayer(Player):
                 self.now_search_depth), best_move) 
             
         if best_move == (-1, -1):
-            print('Randomly get a best_move')
-            best_move = candidate_moves[np.random.choice(len(candidate_moves))]
+            if self.verbose:
+                print('Randomly get a best_move')
+            best_move = self.random_move(candidate_moves)
+            pv = [best_move]
+        self.best_score = best_score
+        self.pv = pv
         return best_move
 
-    def min_value(self, board, depth):
-        """ Return the value for a win (+1) if the board is over,
-        otherwise return the minimum value over all legal child
-        nodes.
+    def random_move(self, moves):
+        """Return one of `moves` at random."""
+        random_state = self.random_state if self.random_state is not None \
+            else np.random
+        return moves[random_state.choice(len(moves))]
+
+    def start_clock(self, board=None):
+        """Start counting the nodes and timing the depths of a search, and
+        tracing it on `board` with `tracer`.
         """
-        if self.time_left() < self.timer_threshold:
-            raise SearchTimeout()
+        self.nodes = 0
+        self.evaluations = 0
+        self.timed_out = False
+        self._next_check = 0
+        self._last_check = None
+        self._search_start = timeit.default_timer()
+        self.iteration_timer.start()
+        if self.tracer is not None and board is not None:
+            self.tracer.start_search(self, board)
 
-        if board.is_winner(self.player_mark):
-            if depth == self.now_search_depth - 1:
-                print('It\'s time to win!', self.now_search_depth, depth)
-                raise WinInAMove()
-            return float("inf")
-        
-        if depth <= 0:
-            # print('s', self.score_fn.get_score(board, self.player_mark))
-            return self.score_fn.get_score(board, self.player_mark)
-        
-        v = float("inf")
-        candidate_moves = self.limited_moves_fn(board, self.opponent_mark)
-        for m in candidate_moves:
-            # print('op do', m)
-            moved_board = board.get_moved_board(m, self.opponent_mark)
-            v = min(v, self.max_value(moved_board, depth - 1))
-        return v
+    def complete_depth(self, board, depth):
+        """Record that the search of `board` completed `depth`."""
+        self.completed_depth = depth
+        self.iteration_timer.record(depth, self.nodes)
+        if self.tracer is not None:
+            self.tracer.end_depth(self, board, depth)
 
-    def max_value(self, board, depth):
-        """ Return the value for a loss (-1) if the board is over,
-        otherwise return the maximum value over all legal child
-        nodes.
+    def finish_search(self, board=None, best_move=None):
+        """Set `search_stats` to the stats of the search which just ended,
+        print them with `print_stats`, and write the trace of the search of
+        `board`, which found `best_move`.
         """
-        if self.time_left() < self.timer_threshold:
+        if self.tracer is not None and board is not None:
+            self.tracer.end_search(self, board, best_move, self.timed_out)
+        self.search_stats = self.get_stats()
+        if self.print_stats:
+            print(self.search_stats)
+
+    def get_stats(self):
+        """Return the `SearchStats` of the search so far."""
+        return SearchStats(
+            nodes=self.nodes,
+            evaluations=self.evaluations,
+            depths=self.iteration_timer.depths,
+            completed_depth=self.completed_depth,
+            timed_out=self.timed_out,
+            time=timeit.default_timer() - self._search_start)
+
+    def check_time(self):
+        """Read the timer, raising `SearchTimeout` when the time is up, and
+        set the node count of the next read.
+        """
+        time_left = self.time_left() - self.timer_threshold
+        if time_left < 0:
             raise SearchTimeout()
 
-        if board.is_loser(self.player_mark):
+        # Read the timer again after `check_every` nodes, or sooner if half
+        # the time left would be gone by then. Until the speed is known,
+        # read it again soon.
+        interval = min(self.check_every, 16)
+        now = timeit.default_timer()
+        if self._last_check is not None:
+            interval = self.check_every
+            nodes, seconds = self._last_check
+            nodes_per_ms = (self.nodes - nodes) \
+                / max(1000. * (now - seconds), 1e-3)
+            interval = int(min(interval, nodes_per_ms * time_left / 2.))
+        self._last_check = (self.nodes, now)
+        self._next_check = self.nodes + max(1, interval)
+
+    def can_start_depth(self, depth):
+        """Return whether `depth` is predicted to finish in the time left.
+        A depth which wouldn't is skipped rather than searched in vain.
+        """
+        predicted = self.iteration_timer.predict()
+        if predicted is None:
+            return True
+        time_left = self.time_left() - self.timer_threshold
+        if predicted > time_left:
+            if self.verbose:
+                print('Skip depth {}: {:.0f} ms predicted, {:.0f} ms left'
+                      .format(depth, predicted, time_left))
+            return False
+        return True
+
+    def new_game(self):
+        """Forget the search context of the last game."""
+        if self.tracer is not None:
+            self.tracer.new_game(self)
+        self.pv = []
+        self.best_score = None
+        self.completed_depth = 0
+        self._last_search = None
+
+    def resume_context(self, board):
+        """Pick up the search context of the last move for `board`.
+
+        If the opponent played the reply the last search expected, that
+        search already looked at `board` to its depth less two plies, so
+        the search starts there, with the next move of the principal
+        variation to play if no depth completes in time. A position from
+        before the last search (or of the other mark) starts a new game.
+
+        Returns
+        -------
+        (int, (int, int))
+            The depth to start from, and the move to play if no depth is
+            completed; (-1, -1) if there is none.
+        """
+        last_search = self._last_search
+        if last_search is not None and (last_search[0] != self.player_mark
+                                        or board.n_step < last_search[1]):
+            self.new_game()
+            last_search = None
+
+        start_depth, best_move = 1, (-1, -1)
+        pv = self.pv
+        if last_search is not None and board.n_step == last_search[1] + 2 \
+                and len(pv) >= 3 \
+                and board.last_moves[self.player_mark] == pv[0] \
+                and board.last_moves[self.opponent_mark] == pv[1] \
+                and board.is_empty(pv[2]):
+            start_depth = max(1, self.completed_depth - 2)
+            best_move = pv[2]
+            if self.verbose:
+                print('Resuming the last search at depth', start_depth)
+        self._last_search = (self.player_mark, board.n_step)
+        self.completed_depth = 0
+        return start_depth, best_move
+
+    def predict_reply(self, board):
+        """Return the reply the last search expected to the move played,
+        from its principal variation.
+        """
+        if len(self.pv) >= 2 and board.last_moves[self.player_mark] == \
+                self.pv[0] and board.is_empty(self.pv[1]):
+            return self.pv[1]
+        return None
+
+    def get_forced_move(self, board, time_left=None):
+        """Ask the threat solver for a forced win or defence, and restrict
+        the root moves to the defences when there are several. The solver
+        stops in the time left on the timer `time_left`, if given.
+        """
+        self._root_moves = None
+        if self.threat_solver is None:
+            return None
+        forced_move, defences = self.threat_solver.get_forced_move(
+            board, self.player_mark,
+            time_left() - self.timer_threshold
+            if time_left is not None else None)
+        if self.verbose:
+            if forced_move is not None:
+                print('Forced move:', forced_move)
+            elif defences is not None:
+                print('Defences:', defences)
+        self._root_moves = defences
+        return forced_move
+
+    def _root_candidates(self, board):
+        """Return the moves of the root, in the order to search them."""
+        candidate_moves = self.limited_moves_fn(board, self.player_mark)
+        if self._root_moves is not None:
+            defences = set(self._root_moves)
+            candidate_moves = [m for m in candidate_moves if m in defences]
+            candidate_moves += [m for m in self._root_moves
+                                if m not in candidate_moves]
+        return self._order_moves(board, candidate_moves, 0,
+                                 self.player_mark, None)
+
+    def negamax(self, board, depth, alpha, beta, ply, player_mark):
+        """Return the value of the board for `player_mark`, the player to
+        move, searching `depth` more plies.
+
+        Parameters
+        ----------
+        board : board.Board
+            The board to search. Moves are pushed and popped on it, so it is
+            the same when the search returns.
+
+        depth : int
+            Number of plies left to search.
+
+        alpha, beta : float
+            The search window, from the view of `player_mark`. Values outside
+            it are only bounds, when the engine prunes.
+
+        ply : int
+            Distance from the root.
+
+        player_mark : str
+            Mark of the player to move.
+        """
+        self.nodes += 1
+        if self.nodes >= self._next_check:
+            self.check_time()
+
+        self._pv[ply] = []
+        
+        # The last move, made by the other player, won the game
+        if board.winner is not None:
             return float("-inf")
         
         if depth <= 0:
-            # print('s', self.score_fn.get_score(board, self.player_mark))
-            return self.score_fn.get_score(board, self.player_mark)
+            self.evaluations += 1
+            score = self.score_fn.get_score(board, self.player_mark)
+            return score if player_mark == self.player_mark else -score
+
+        alpha_orig, beta_orig = alpha, beta
+        cut, alpha, beta, tt_move = self._probe_tt(board, alpha, beta, depth)
+        if cut is not None:
+            return cut
         
         v = float("-inf")
-        candidate_moves = self.limited_moves_fn(board, self.player_mark)
-        for m in candidate_moves:
-            # print('me do', m)
-            moved_board = board.get_moved_board(m, self.player_mark)
-            v = max(v, self.min_value(moved_board, depth - 1))
+        best_move = None
+
+        candidate_moves = self._order_moves(
+            board, self.limited_moves_fn(board, player_mark),
+            ply, player_mark, tt_move)
+        for k, m in enumerate(candidate_moves):
+            board.push(m, player_mark)
+            try:
+                v_m = -self._search_child(board, m, k, -beta, -alpha,
+                                          depth, ply, player_mark)
+            finally:
+                board.pop()
+            if best_move is None or v_m > v:
+                v = v_m
+                best_move = m
+                self._pv[ply] = [m] + self._pv.get(ply + 1, [])
+            if self.prune:
+                if v >= beta:
+                    self._on_cutoff(m, ply, player_mark, depth, k + 1)
+                    break
+                alpha = max(alpha, v)
+
+        self._store_tt(board, alpha_orig, beta_orig, depth, v, best_move)
         return v
 
+    def _search_child(self, board, move, k, alpha, beta, depth, ply,
+                      player_mark):
+        """Search the `k`-th child (from 0) of a node at `ply` with `depth`
+        plies left, after `move` of `player_mark` was pushed on `board`.
+
+        The window and the value returned are from the view of the player to
+        move in the child. A reduced search which fails low is trusted,
+        otherwise the child is searched again to its full depth.
+        """
+        opponent_mark = self.opponent_mark \
+            if player_mark == self.player_mark else self.player_mark
+        new_depth = depth - 1 + self._extension(board, move, ply, depth)
+        reduction = self._reduction(board, move, k, ply, depth)
+        if reduction > 0:
+            v = self.negamax(board, new_depth - reduction, alpha, beta,
+                             ply + 1, opponent_mark)
+            if v >= beta:
+                return v
+        return self.negamax(board, new_depth, alpha, beta, ply + 1,
+                            opponent_mark)
+
+    def _probe_tt(self, board, alpha, beta, depth):
+        """Look up the board in the transposition table.
+
+        Returns
+        -------
+        (float, float, float, (int, int))
+            The score to return if the stored bound causes a cutoff (None
+            otherwise), the narrowed alpha and beta, and the stored best move.
+        """
+        return None, alpha, beta, None
+
+    def _store_tt(self, board, alpha, beta, depth, v, best_move):
+        pass
+
+    def _order_moves(self, board, candidate_moves, ply, player_mark,
+                     tt_move):
+        """Return the candidate moves in the order to search them."""
+        return candidate_moves
+
+    def _on_cutoff(self, move, ply, player_mark, depth, n_tried):
+        """Called when `move`, the `n_tried`-th move searched, cuts off."""
+        pass
+
+    def _extension(self, board, move, ply, depth):
+        """Return the number of plies to search `move` deeper."""
+        return 0
+
+    def _reduction(self, board, move, k, ply, depth):
+        """Return the number of plies to search the `k`-th move less. The
+        move is searched again to the full depth if it doesn't fail low.
+        """
+        return 0
+
 
 class AlphaBetaPlayer(MinimaxPlayer):
     """Game-playing agent that chooses a move using iterative deepening minimax
     search with alpha-beta pruning. You must finish and test this player to
     make sure it returns a good move before the search time limit expires.
+
+    Parameters
+    ----------
+    tt_size_mb : float (optional)
+        Memory cap (in megabytes) of the transposition table shared by the
+        iterative-deepening searches of a move. 0 disables the table.
+
+    move_ordering : players.ordering.MoveOrdering (optional)
+        The stage ordering the moves of the search nodes. Defaults to a
+        `KillerHistoryOrdering`; a plain `MoveOrdering` only tries the
+        transposition-table move first.
+
+    pvs : bool (optional)
+        Use principal variation search: search the first move of a node
+        with the full window and the others with a null window, which only
+        tells whether they beat the first one, and re-search those which do.
+
+    aspiration : float (optional)
+        Half-width of the aspiration window, relative to the score of the
+        previous depth. Each depth after the first is searched in that
+        window around the last score first, and re-searched with the failed
+        side opened if the score falls outside. None searches every depth
+        with the full window.
+
+    n_workers : int (optional)
+        Number of processes searching each move. With more than one, the
+        search runs in Lazy SMP: helper processes search the same root
+        with a transposition table in shared memory, and the deepest
+        result completed before the deadline is played.
+
+    root_split : bool (optional)
+        With `n_workers` above one, search in parallel by splitting the
+        root instead: the first root move is searched in this process, and
+        the others in a pool of `n_workers` processes, with its score as
+        alpha. Unlike Lazy SMP, the result doesn't depend on timing.
+
+    See `MinimaxPlayer` for the other parameters.
     """
 
+    prune = True
+
+    def __init__(self, 
+                 score_fn=NullScore(),
+                 initial_moves_fn = null_im,
+                 limited_moves_fn = null_lm,
+                 timeout=10.,
+                 verbose=False,
+                 tt_size_mb=16,
+                 move_ordering=None,
+                 pvs=False,
+                 aspiration=None,
+                 n_workers=1,
+                 root_split=False,
+                 threat_solver=None,
+                 check_every=256,
+                 print_stats=False,
+                 tracer=None,
+                 seed=None):
+        super(AlphaBetaPlayer, self).__init__(
+            score_fn, initial_moves_fn, limited_moves_fn, timeout, verbose,
+            threat_solver, check_every, print_stats, tracer, seed)
+        self.n_workers = n_workers
+        self.tt_size_mb = tt_size_mb
+        self.root_split = RootSplit(self, n_workers) \
+            if root_split and n_workers > 1 else None
+        self.tt = TranspositionTable(
+            tt_size_mb, shared=n_workers > 1 and self.root_split is None) \
+            if tt_size_mb else None
+        self.move_ordering = move_ordering if move_ordering is not None \
+            else KillerHistoryOrdering()
+        self.pvs = pvs
+        self.aspiration = aspiration
+        self.aspiration_researches = 0
+
+        # 0 in the main process, and the number of the helper in the helper
+        # processes of a parallel search
+        self.worker_id = 0
+
+        # _pv_moves maps the positions of the previous depth's principal
+        # variation to the move played there
+        self._pv_moves = {}
+
     def get_move(self, board, time_left):
         """Search for the best move from the available legal moves and return a
         result before the time limit expires.
@@ -226,35 +710,206 @@ class AlphaBetaPlayer(MinimaxPlayer):
             (-1, -1) if there are no available legal moves.
         """
         
+        self.search_stats = None
         initial_move = self.initial_moves_fn(board)
         if initial_move:
             return initial_move
+
+        forced_move = self.get_forced_move(board, time_left)
+        if forced_move is not None:
+            return forced_move
         
         self.time_left = time_left
-
         # Initialize the best move so that this function returns something
         # in case the search fails due to timeout
-        best_move = (-1, -1)
-    
+        start_depth, best_move = self.resume_context(board)
+        self.start_clock(board)
+        
         try:
-            search_depth = 1
-            while search_depth <= len(board.legal_moves):
-                self.now_search_depth = search_depth
-                if self.verbose:
-                    print('-' * 35)
-                print('Now searching depth:', search_depth)
-                best_move = self.alphabeta(board, search_depth)
-                search_depth += 1
+            if self.n_workers > 1 and self.root_split is None:
+                best_move = self._parallel_search(
+                    board, start_depth, best_move)
+            else:
+                for best_move in self.deepen(board, start_depth):
+                    pass
         except SearchTimeout:
-            print('[W] Search timeout!')
+            if self.verbose:
+                print('[W] Search timeout!')
+            self.timed_out = True
+        finally:
+            self.finish_search(board, best_move)
             
         if best_move == (-1, -1):
-            print('Randomly get a best_move')
-            best_move = \
-                board.legal_moves[np.random.choice(len(board.legal_moves))]
+            if self.verbose:
+                print('Randomly get a best_move')
+            best_move = self.random_move(board.legal_moves)
         return best_move
 
-    @print_time
+    def __getstate__(self):
+        state = super(AlphaBetaPlayer, self).__getstate__()
+        state['root_split'] = None
+        return state
+
+    def new_game(self):
+        super(AlphaBetaPlayer, self).new_game()
+        self.new_search()
+
+    def resume_context(self, board):
+        """Pick up the search context of the last move for `board`, see
+        `MinimaxPlayer.resume_context`. The transposition table, the move
+        ordering and the principal variation of the last search are kept
+        within a game, and cleared when a new game starts.
+        """
+        last_search = self._last_search
+        start_depth, best_move = \
+            super(AlphaBetaPlayer, self).resume_context(board)
+        if last_search is not None and last_search[0] == self.player_mark \
+                and board.n_step >= last_search[1]:
+            # Same game: age the tables of the last search
+            if self.tt is not None:
+                self.tt.new_generation()
+                self.tt.reset_counters()
+            self.move_ordering.next_search(board.n_step - last_search[1])
+        self.aspiration_researches = 0
+        self._pv = {}
+        return start_depth, best_move
+
+    def get_stats(self):
+        stats = super(AlphaBetaPlayer, self).get_stats()
+        if self.tt is not None:
+            stats.tt_hits = self.tt.hits
+            stats.tt_probes = self.tt.hits + self.tt.misses
+        stats.cutoffs = self.move_ordering.cutoffs
+        stats.first_move_cutoffs = self.move_ordering.first_move_cutoffs
+        return stats
+
+    def new_search(self):
+        """Forget the tables of the last search."""
+        # Scores in the table are from the view of this player, and moves
+        # change the player's mark between games, so start a new table.
+        if self.tt is not None:
+            self.tt.clear()
+        self.move_ordering.clear()
+        self.pv = []
+        self.best_score = None
+        self.aspiration_researches = 0
+        self._pv = {}
+        self._pv_moves = {}
+
+    def predict_reply(self, board):
+        # Root-split workers get the deadline of each depth when it starts,
+        # which a ponder hit couldn't bring forward
+        if self.root_split is not None:
+            return None
+        return super(AlphaBetaPlayer, self).predict_reply(board)
+
+    def worker_copy(self, tt_size_mb=None):
+        """Return a copy of the player, with tables of its own, for a
+        worker process searching part of a parallel search. The table is
+        at most `tt_size_mb` large, by default as large as the player's.
+        """
+        tt_size_mb = self.tt_size_mb if tt_size_mb is None \
+            else min(tt_size_mb, self.tt_size_mb)
+        player = copy(self)
+        player.n_workers = 1
+        player.root_split = None
+        player.verbose = False
+        player.tracer = None
+        player.tt = TranspositionTable(tt_size_mb) if tt_size_mb else None
+        player.move_ordering = copy(self.move_ordering)
+        player.move_ordering.clear()
+        return player
+
+    def close(self):
+        """Stop the worker processes of a root-split search."""
+        if self.root_split is not None:
+            self.root_split.close()
+
+    def deepen(self, board, start_depth=1):
+        """Search `board` to increasing depths, yielding the best move of
+        each depth completed. Stops before a depth predicted not to finish,
+        and raises `SearchTimeout` when the time is up.
+        """
+        search_depth = start_depth
+        while search_depth <= board.n_legal_moves \
+                and self.can_start_depth(search_depth):
+            self.now_search_depth = search_depth
+            if self.verbose:
+                print('-' * 35)
+                print('Now searching depth:', search_depth)
+            best_move = self.aspiration_search(board, search_depth)
+            self.complete_depth(board, search_depth)
+            self._set_pv_moves(board)
+            if self.verbose and self.tt is not None:
+                print('Transposition table:', self.tt.stats())
+            if self.verbose:
+                print('Move ordering:', self.move_ordering.stats())
+                print('Principal variation:', self.pv)
+            yield best_move
+            search_depth += 1
+
+    def _parallel_search(self, board, start_depth=1, best_move=(-1, -1)):
+        """Search with `n_workers - 1` helper processes from `start_depth`,
+        and return the deepest result completed by any of them or by this
+        process, or `best_move` if there is none.
+        """
+        deadline = time.time() \
+            + (self.time_left() - self.timer_threshold) / 1000.
+        helpers = LazySMP(self, self.n_workers - 1)
+        helpers.start(board, deadline, start_depth)
+
+        # (depth, worker_id, best_move, best_score, pv) of the best result
+        best = (0, 0, best_move, self.best_score, self.pv)
+        try:
+            for best_move in self.deepen(board, start_depth):
+                best = (self.now_search_depth, 0, best_move,
+                        self.best_score, self.pv)
+        except SearchTimeout:
+            if self.verbose:
+                print('[W] Search timeout!')
+            self.timed_out = True
+        finally:
+            results = helpers.stop()
+
+        for worker_id, depth, best_move, best_score, pv in results:
+            # The main process wins ties, then the lower helpers
+            if depth > best[0]:
+                best = (depth, worker_id, best_move, best_score, pv)
+        depth, worker_id, best_move, self.best_score, self.pv = best
+        self.completed_depth = depth
+        if self.verbose:
+            print('Deepest search: depth {} by worker {}'.format(
+                depth, worker_id))
+        return best_move
+
+    def aspiration_search(self, board, depth):
+        """Search a depth in an aspiration window around the score of the
+        previous depth, widening the window when the score falls outside.
+        """
+        alpha, beta = float("-inf"), float("inf")
+        if self.aspiration is not None and self.best_score is not None \
+                and abs(self.best_score) != float("inf"):
+            delta = self.aspiration * max(abs(self.best_score), 1.)
+            alpha = self.best_score - delta
+            beta = self.best_score + delta
+
+        while True:
+            best_move = self.alphabeta(board, depth, alpha, beta)
+            # A won or lost game is exact whatever the window
+            if alpha < self.best_score < beta \
+                    or abs(self.best_score) == float("inf"):
+                return best_move
+
+            # Fail low or high: the score is only a bound, search again
+            self.aspiration_researches += 1
+            if self.verbose:
+                print('Aspiration window ({:.2E}, {:.2E}) failed: {:.2E}'
+                      .format(alpha, beta, self.best_score))
+            if self.best_score <= alpha:
+                alpha = float("-inf")
+            else:
+                beta = float("inf")
+
     def alphabeta(self, board, depth, alpha=float("-inf"), beta=float("inf")):
         """Depth-limited minimax search with alpha-beta pruning.
         
@@ -278,102 +933,140 @@ class AlphaBetaPlayer(MinimaxPlayer):
         -------
         (int, int)
             The board coordinates of the best move found in the current search;
-            (-1, -1) if there are no legal moves
+            (-1, -1) if there are no legal moves. Its score is kept in
+            `best_score` and the principal variation in `pv`.
         """
-        if self.time_left() < self.timer_threshold:
-            raise SearchTimeout()
+        if self.root_split is not None:
+            return self._search_root_split(board, depth, alpha, beta)
+        return self.search_root(board, depth, alpha, beta)
 
-        best_score = float("-inf")
-        best_move = (-1, -1)
-       
-        scores = board._board_state.tolist()
-        
-        candidate_moves = self.limited_moves_fn(board, self.player_mark)
-        for m in candidate_moves:
-            try:
-                moved_board = board.get_moved_board(m, self.player_mark)
-                v = self.min_value(moved_board, alpha, beta, depth - 1)
+    def _search_root_split(self, board, depth, alpha, beta):
+        """Search the root like `search_root`, with the moves after the
+        first one spread over the pool of `root_split`.
 
-                # Print information
-                if self.verbose:
-                    if -100000. < v < 100000.:
-                        scores[m[0]][m[1]] = '{:.2f}'.format(v)
-                    else:
-                        scores[m[0]][m[1]] = '{:.2E}'.format(v)
-                
-                if v > best_score:
-                    best_score = v
+        The first move, the principal variation of the last depth, is
+        searched here first (Young Brothers Wait), so the others are
+        searched with its score as alpha. The results are taken in the
+        order of the moves, up to the first cutoff, so the best move and
+        its score only depend on the moves, not on the timing of the
+        workers. They can differ from a serial search, whose later moves
+        get the narrower window of the earlier ones.
+        """
+        deadline = time.time() \
+            + (self.time_left() - self.timer_threshold) / 1000.
+        candidate_moves = self._root_candidates(board)
+        # Keep the result of the last depth until this one is complete
+        last_result = self.best_score, self.pv
+        best_move = self.search_root(board, depth, alpha, beta,
+                                     candidate_moves[:1])
+        best_score, pv = self.best_score, self.pv
+        rest = candidate_moves[1:]
+        if rest and best_score < beta:
+            self.best_score, self.pv = last_result
+            results = self.root_split.search(
+                board, rest, depth, max(alpha, best_score), beta, deadline)
+            # Count the nodes of the workers, so the iteration timer
+            # measures the growth of the whole depth
+            self.nodes += self.root_split.nodes
+            for m, result in zip(rest, results):
+                if result is not None and result[0] > best_score:
+                    best_score = result[0]
                     best_move = m
-                alpha = max(alpha, v)
-            except WinInAMove:
-                best_move = m
-                break
-        
-        # Print information 
+                    pv = [m] + result[1]
+            self._store_tt(board, alpha, beta, depth, best_score, best_move)
+        self.best_score, self.pv = best_score, pv
         if self.verbose:
-            print('Scores:')
-            print(pd.DataFrame(scores))
             print('Best move found in depth {}:'.format(
                 self.now_search_depth), best_move)
-            
-        if best_move == (-1, -1):
-            print('Randomly get a best_move')
-            best_move = candidate_moves[np.random.choice(len(candidate_moves))]
         return best_move
 
-    def min_value(self, board, alpha, beta, depth):
-        """ Return the value for a win (+1) if the game is over,
-        otherwise return the minimum value over all legal child
-        nodes.
+    def _search_child(self, board, move, k, alpha, beta, depth, ply,
+                      player_mark):
+        """With `pvs`, only the first child gets the full window. The others
+        are searched with a null window at the bound the node is trying to
+        improve, and searched again with the full window if they beat it.
         """
-        if self.time_left() < self.timer_threshold:
-            raise SearchTimeout()
+        search = super(AlphaBetaPlayer, self)._search_child
+        if not self.pvs or k == 0:
+            return search(board, move, k, alpha, beta, depth, ply,
+                          player_mark)
+        # The child's beta is the parent's alpha
+        v = search(board, move, k, math.nextafter(beta, alpha), beta,
+                   depth, ply, player_mark)
+        if alpha < v < beta:
+            v = search(board, move, k, alpha, beta, depth, ply, player_mark)
+        return v
 
-        if board.is_winner(self.player_mark):
-            if depth == self.now_search_depth - 1:
-                print('It\'s time to win!', self.now_search_depth, depth)
-                raise WinInAMove()
-            return float("inf")
+    def _probe_tt(self, board, alpha, beta, depth):
+        if self.tt is None:
+            return None, alpha, beta, None
         
-        if depth <= 0:
-            # print('s', self.score_fn.get_score(board, self.player_mark))
-            return self.score_fn.get_score(board, self.player_mark)
-        
-        v = float("inf")
+        entry = self.tt.probe(board.zobrist_hash)
+        if entry is None:
+            return None, alpha, beta, None
         
-        candidate_moves = self.limited_moves_fn(board, self.opponent_mark)
-        for m in candidate_moves:
-            # print('op do', m)
-            moved_board = board.get_moved_board(m, self.opponent_mark)
-            v = min(v, self.max_value(moved_board, alpha, beta, depth - 1))
-            if v <= alpha:
-                return v
-            beta = min(beta, v)
-        return v
+        tt_depth, tt_flag, tt_score, tt_move = entry
+        if tt_depth >= depth:
+            if tt_flag == EXACT:
+                return tt_score, alpha, beta, tt_move
+            if tt_flag == LOWER:
+                alpha = max(alpha, tt_score)
+            elif tt_flag == UPPER:
+                beta = min(beta, tt_score)
+            if alpha >= beta:
+                return tt_score, alpha, beta, tt_move
+        return None, alpha, beta, tt_move
 
-    def max_value(self, board, alpha, beta, depth):
-        """ Return the value for a loss (-1) if the game is over,
-        otherwise return the maximum value over all legal child
-        nodes.
-        """
-        if self.time_left() < self.timer_threshold:
-            raise SearchTimeout()
+    def _store_tt(self, board, alpha, beta, depth, v, best_move):
+        if self.tt is None or best_move is None:
+            return
+        if v <= alpha:
+            flag = UPPER
+        elif v >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.tt.store(board.zobrist_hash, depth, flag, v, best_move)
 
-        if board.is_loser(self.player_mark):
-            return float("-inf")
-        
-        if depth <= 0:
-            # print('s', self.score_fn.get_score(board, self.player_mark))
-            return self.score_fn.get_score(board, self.player_mark)
-        
-        v = float("-inf")
-        
-        candidate_moves = self.limited_moves_fn(board, self.player_mark)
-        for m in candidate_moves:
-            # print('me do', m)
-            moved_board = board.get_moved_board(m, self.player_mark)
-            v = max(v, self.min_value(moved_board, alpha, beta, depth - 1))
-            if v >= beta:
-                return v
-            alpha = max(alpha, v)
-        return v
+    def _order_moves(self, board, candidate_moves, ply, player_mark,
+                     tt_move):
+        # Search the principal variation first, else the best move of the
+        # previous iteration
+        pv_move = self._pv_moves.get(board.zobrist_hash, tt_move)
+        if ply == 0:
+            if pv_move is None and self.tt is not None:
+                entry = self.tt.probe(board.zobrist_hash)
+                if entry is not None:
+                    pv_move = entry[3]
+            candidate_moves = tt_move_first(candidate_moves, pv_move)
+            if self.worker_id:
+                # Helpers of a parallel search try the other root moves in
+                # their own order, so they don't all search the same tree
+                rest = candidate_moves[1:]
+                random.Random(self.worker_id).shuffle(rest)
+                candidate_moves = candidate_moves[:1] + rest
+            return candidate_moves
+        return self.move_ordering.order(
+            candidate_moves, ply, player_mark, pv_move)
+
+    def _on_cutoff(self, move, ply, player_mark, depth, n_tried):
+        self.move_ordering.record_cutoff(
+            move, ply, player_mark, depth, n_tried)
+
+    def _set_pv_moves(self, board):
+        """Map the positions of the principal variation to its moves, so the
+        next depth searches it first.
+        """
+        self._pv_moves = {}
+        marks = (self.player_mark, self.opponent_mark)
+        n_pushed = 0
+        try:
+            for k, m in enumerate(self.pv):
+                if not board.is_empty(m) or board.winner is not None:
+                    break
+                self._pv_moves[board.zobrist_hash] = m
+                board.push(m, marks[k % 2])
+                n_pushed += 1
+        finally:
+            for _ in range(n_pushed):
+                board.pop()
@@ -0,0 +1,122 @@
+def tt_move_first(candidate_moves, tt_move):
+    """Move the best move stored in the transposition table to the front."""
+    if tt_move is None or tt_move not in candidate_moves:
+        return candidate_moves
+    return [tt_move] + [m for m in candidate_moves if m != tt_move]
+
+
+class MoveOrdering(object):
+    """Order the candidate moves of a search node.
+
+    This base stage only tries the transposition-table move first and keeps
+    the rest in the order of `limited_moves_fn`. It also counts the cutoffs
+    of the search, and how many of them the first move tried caused, which
+    measures how good the ordering is.
+
+    A search calls `order` before trying the moves of a node, and
+    `record_cutoff` when a move causes a cutoff. Subclasses override them to
+    learn from the cutoffs.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """Forget what was learned, e.g. when a new game starts."""
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def next_search(self, plies):
+        """Carry what was learned over to the search of the next move,
+        `plies` moves later in the game.
+        """
+        self.reset_counters()
+
+    def order(self, candidate_moves, ply, player_mark, tt_move=None):
+        """Return the moves of `player_mark` at `ply` (0 at the root) in the
+        order they should be searched.
+        """
+        return tt_move_first(candidate_moves, tt_move)
+
+    def record_cutoff(self, move, ply, player_mark, depth, n_tried):
+        """Record that `move`, the `n_tried`-th move searched (from 1) at a
+        node with `depth` plies left, caused a cutoff.
+        """
+        self.cutoffs += 1
+        if n_tried == 1:
+            self.first_move_cutoffs += 1
+
+    def stats(self):
+        return {
+            'cutoffs': self.cutoffs,
+            'first_move_cutoffs': self.first_move_cutoffs,
+            'first_move_cutoff_rate':
+                self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.,
+        }
+
+
+class KillerHistoryOrdering(MoveOrdering):
+    """Order moves by the transposition-table move, then the killer moves of
+    the ply, then the history heuristic.
+
+    Killer moves are the last moves which caused a cutoff at a ply; the
+    positions of sibling nodes are alike, so they often cut there as well.
+    The history table adds ``depth ** 2`` to a (mark, cell) each time a move
+    of that mark on that cell causes a cutoff, and the other moves are
+    searched by decreasing history. Ties keep the order of
+    `limited_moves_fn`.
+
+    Parameters
+    ----------
+    n_killers : int (optional)
+        Number of killer moves kept per ply.
+    """
+
+    def __init__(self, n_killers=2):
+        self.n_killers = n_killers
+        super(KillerHistoryOrdering, self).__init__()
+
+    def clear(self):
+        super(KillerHistoryOrdering, self).clear()
+        # killers[ply] lists the killer moves of a ply, latest first
+        self.killers = {}
+        # history[(mark, move)] is the history score of a move
+        self.history = {}
+
+    def next_search(self, plies):
+        super(KillerHistoryOrdering, self).next_search(plies)
+        # The nodes at ply k of the next search are at ply k + plies of
+        # the last one. Halve the history, so the new cutoffs weigh more.
+        self.killers = {ply - plies: killers
+                        for ply, killers in self.killers.items()
+                        if ply >= plies}
+        self.history = {key: value // 2
+                        for key, value in self.history.items() if value > 1}
+
+    def order(self, candidate_moves, ply, player_mark, tt_move=None):
+        first = []
+        if tt_move is not None and tt_move in candidate_moves:
+            first.append(tt_move)
+        for m in self.killers.get(ply, ()):
+            if m not in first and m in candidate_moves:
+                first.append(m)
+        if not first and not self.history:
+            return candidate_moves
+
+        history = self.history
+        rest = [m for m in candidate_moves if m not in first]
+        rest.sort(key=lambda m: -history.get((player_mark, m), 0))
+        return first + rest
+
+    def record_cutoff(self, move, ply, player_mark, depth, n_tried):
+        super(KillerHistoryOrdering, self).record_cutoff(
+            move, ply, player_mark, depth, n_tried)
+        killers = self.killers.setdefault(ply, [])
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[self.n_killers:]
+        key = (player_mark, move)
+        self.history[key] = self.history.get(key, 0) + depth * depth
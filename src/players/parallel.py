@@ -0,0 +1,267 @@
+import os
+import sys
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait
+
+from players.players import SearchTimeout
+
+
+def get_context():
+    """Fork where the platform can, so helpers start without pickling the
+    player and its score tables.
+    """
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context()
+
+
+def _lazy_smp_worker(player, board, worker_id, deadline, start_depth, stop,
+                     results):
+    """Run the iterative deepening of `player` on `board` in a helper
+    process, putting (worker_id, depth, best_move, best_score, pv) on
+    `results` for every depth completed.
+    """
+    sys.stdout = open(os.devnull, 'w')
+    player.time_left = \
+        lambda: 0. if stop.value else 1000. * (deadline - time.time())
+    player.worker_id = worker_id
+    player.tracer = None
+    player.start_clock()
+    try:
+        # Odd helpers start one depth ahead of the others
+        for best_move in player.deepen(board,
+                                       start_depth + worker_id % 2):
+            results.put((worker_id, player.now_search_depth, best_move,
+                         player.best_score, player.pv))
+    except SearchTimeout:
+        pass
+
+
+class LazySMP(object):
+    """Helper processes of a Lazy SMP search.
+
+    Every helper runs the whole iterative deepening of the root, like the
+    main process, with the transposition table of the player in shared
+    memory. The helpers start at staggered depths and try the root moves in
+    different orders, so they fill the table with different parts of the
+    tree, which the other searches then find instead of searching again.
+
+    Parameters
+    ----------
+    player : players.minimax.AlphaBetaPlayer
+        The searching player. Each helper gets a copy of it.
+
+    n_helpers : int
+        Number of helper processes.
+    """
+
+    def __init__(self, player, n_helpers):
+        self.player = player
+        self.n_helpers = n_helpers
+        self.processes = []
+
+    def start(self, board, deadline, start_depth=1):
+        """Start the helpers searching `board` from `start_depth` until
+        `deadline` (in seconds of `time.time()`).
+        """
+        ctx = get_context()
+        self._stop = ctx.RawValue('b', 0)
+        self._results = ctx.SimpleQueue()
+        self.processes = [
+            ctx.Process(target=_lazy_smp_worker,
+                        args=(self.player, board, worker_id, deadline,
+                              start_depth, self._stop, self._results),
+                        daemon=True)
+            for worker_id in range(1, self.n_helpers + 1)]
+        for p in self.processes:
+            p.start()
+
+    def stop(self, timeout=1.):
+        """Stop the helpers and return the results they put, as
+        (worker_id, depth, best_move, best_score, pv).
+        """
+        self._stop.value = 1
+        for p in self.processes:
+            p.join(timeout)
+            if p.is_alive():
+                p.terminate()
+                p.join()
+        results = []
+        while not self._results.empty():
+            results.append(self._results.get())
+        self.processes = []
+        return results
+
+
+def encode_board(board):
+    """Encode a board compactly to send it to another process: its cells
+    as bytes, and what the cells don't tell.
+    """
+    return (type(board), board.to_bytes(), board.height, board.width,
+            board.m, dict(board.last_moves), board.n_step,
+            board.zobrist_seed, board.surrond_radius)
+
+
+def decode_board(data):
+    (board_class, cells, height, width, m, last_moves, n_step,
+     zobrist_seed, surround_radius) = data
+    board = board_class.from_bytes(cells, height, width, m, last_moves,
+                                   zobrist_seed, surround_radius)
+    board.n_step = n_step
+    return board
+
+
+# The player of a root-split worker process, and the shared index of the
+# last root move of the search still to search
+_worker_player = None
+_worker_stop = None
+
+
+def _init_root_worker(player, stop):
+    """Keep a copy of the player, with its score tables, for the life of a
+    worker process.
+    """
+    global _worker_player, _worker_stop
+    sys.stdout = open(os.devnull, 'w')
+    _worker_player = player
+    _worker_stop = stop
+
+
+def _search_root_move(data, player_mark, k, move, depth, alpha, beta,
+                      deadline):
+    """Search the `k`-th root move `move` of `player_mark` on the encoded
+    board `data` in a worker process. The search starts from empty tables,
+    so its result doesn't depend on the moves the worker searched before,
+    and stops with `SearchTimeout` at the deadline or when the moves from
+    `k` on are no longer needed.
+
+    Returns
+    -------
+    (float, list of (int, int), int)
+        The score of the move for the root player, the principal variation
+        after it, and the number of nodes searched.
+    """
+    player = _worker_player
+    player.assign_player_mark(player_mark)
+    player.time_left = lambda: 0. if _worker_stop.value < k \
+        else 1000. * (deadline - time.time())
+    if player.time_left() < player.timer_threshold:
+        raise SearchTimeout()
+    player.now_search_depth = depth
+    player.new_search()
+    player.start_clock()
+
+    board = decode_board(data)
+    board.push(move, player.player_mark)
+    if board.is_winner(player.player_mark):
+        return float("inf"), [], 0
+    v = -player.negamax(board, depth - 1, -beta, -alpha, 1,
+                        player.opponent_mark)
+    return v, player._pv.get(1, []), player.nodes
+
+
+class RootSplit(object):
+    """Process pool searching the root moves of a player in parallel.
+
+    The workers are started on first use and kept until `close`, so each
+    loads the player's score tables once. A worker gets a board as its
+    cells and a few fields (see `encode_board`), not as a pickled board.
+
+    Every move is searched with the same window, and from empty tables, so
+    the result of a search only depends on the moves and their order, not
+    on which worker searched what first. The workers' tables are small, to
+    be cleared for each move at little cost.
+
+    Parameters
+    ----------
+    player : players.minimax.AlphaBetaPlayer
+        The searching player. Each worker keeps a copy of it, with its own
+        transposition table.
+
+    n_workers : int
+        Number of worker processes.
+
+    worker_tt_size_mb : float (optional)
+        Memory cap (in megabytes) of the transposition table of a worker.
+
+    Attributes
+    ----------
+    nodes : int
+        Number of nodes searched by the workers in the last search, counting
+        the moves dropped after a cutoff.
+    """
+
+    def __init__(self, player, n_workers, worker_tt_size_mb=1):
+        self.player = player
+        self.n_workers = n_workers
+        self.worker_tt_size_mb = worker_tt_size_mb
+        self.pool = None
+        self.nodes = 0
+
+    def _start(self):
+        ctx = get_context()
+        self._stop = ctx.RawValue('i', -1)
+        self.pool = ProcessPoolExecutor(
+            self.n_workers, mp_context=ctx, initializer=_init_root_worker,
+            initargs=(self.player.worker_copy(self.worker_tt_size_mb),
+                      self._stop))
+
+    def search(self, board, moves, depth, alpha, beta, deadline):
+        """Search the root `moves` of `board` in the pool, all with the
+        window (`alpha`, `beta`).
+
+        A move which cuts off stops the moves after it, like in a serial
+        search, but the moves before it are still searched, so the first
+        move to cut off is always found. The running searches are stopped
+        and waited for before returning, so the pool is free for the next
+        search.
+
+        Returns
+        -------
+        list of (float, list of (int, int))
+            The score and principal variation of each move, in the order of
+            `moves`, or None for the moves not searched after a cutoff.
+
+        Raises
+        ------
+        SearchTimeout
+            If the deadline passes before the moves are searched.
+        """
+        if self.pool is None:
+            self._start()
+        self._stop.value = len(moves)
+        self.nodes = 0
+        data = encode_board(board)
+        futures = {self.pool.submit(_search_root_move, data,
+                                    self.player.player_mark, k, m, depth,
+                                    alpha, beta, deadline): k
+                   for k, m in enumerate(moves)}
+        results = [None] * len(moves)
+        try:
+            for future in as_completed(futures):
+                k = futures[future]
+                if k > self._stop.value:
+                    # Stopped after a cutoff of an earlier move
+                    if future.exception() is None:
+                        self.nodes += future.result()[2]
+                    continue
+                v, pv, nodes = future.result()
+                self.nodes += nodes
+                results[k] = (v, pv)
+                if v >= beta:
+                    self._stop.value = k
+            # Drop the moves searched before an earlier move cut off
+            for k in range(self._stop.value + 1, len(moves)):
+                results[k] = None
+        finally:
+            self._stop.value = -1
+            for future in futures:
+                future.cancel()
+            wait(futures)
+        return results
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
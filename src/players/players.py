@@ -36,6 +36,25 @@ class Player(object):
     def get_move(self, board, time_left):
         raise NotImplementedError
 
+    def new_game(self):
+        """Forget what was kept from the moves of the last game. Called
+        by the game loops before a game starts.
+        """
+        pass
+
+    def predict_reply(self, board):
+        """Return the most likely move of the opponent, to move on `board`,
+        for a `Ponderer` to search the position after it, or None.
+        """
+        return None
+
+    def ponder(self, board, time_left):
+        """Think on `board`, the opponent to move, until `time_left` runs
+        out, keeping what helps the next `get_move`. Players which can't
+        ponder return at once.
+        """
+        pass
+
 
 class HumanPlayer(Player):
 
@@ -0,0 +1,316 @@
+import os
+import pickle
+
+import numpy as np
+
+from strategies.get_initial_moves import null_im
+from strategies.get_limited_moves import advanced_lm
+
+from players.players import Player
+from players.threats import ThreatSpaceSolver
+from utils import get_opponent
+
+
+# Proof or disproof number of a solved node
+INF = 10 ** 9
+
+
+class ProofNumberPlayer(Player):
+    """Game-playing agent that proves or disproves wins with depth-first
+    proof-number search (df-pn).
+
+    The proof number of a node is the least number of unsolved leaves that
+    must turn out won to prove that the player at the root (the attacker)
+    wins, and the disproof number the least number that must turn out lost
+    to prove that it doesn't, i.e. that the game is a draw or a loss. The
+    numbers are kept in a transposition table as (phi, delta) from the view
+    of the player to move: (proof, disproof) where the attacker moves, and
+    (disproof, proof) where the defender moves. The search always expands
+    the most proving node, and only returns to the parent when the numbers
+    of a node pass thresholds the parent gives it.
+
+    A node where the player to move has a winning cell is won, and a node
+    where the opponent has one is searched on the blocking cells only (or
+    is lost if there are two). Otherwise the moves come from
+    `limited_moves_fn`, for both players: a proof is a proof against the
+    replies that function gives, which is all of them with `null_lm`.
+
+    Parameters
+    ----------
+    initial_moves_fn : callable (optional)
+        Opening move strategy, as for `MinimaxPlayer`.
+
+    limited_moves_fn : callable (optional)
+        Moves of a node, as (board, player_mark) -> list of moves.
+
+    max_nodes : int (optional)
+        Maximum number of nodes expanded by one call of `solve`.
+
+    max_entries : int (optional)
+        Memory budget of the table, in entries. Above it, the unsolved
+        entries with the least numbers are dropped, down to half the
+        budget. Proofs and disproofs are kept.
+
+    timeout : float (optional)
+        Time (in milliseconds) left on the timer when `get_move` stops
+        searching.
+
+    tree_file : str (optional)
+        File persisting the table. It is loaded when the player is made, if
+        it exists, and saved after every `solve`, so a search stopped by a
+        budget resumes where it stopped, in this process or the next.
+
+    seed : int (optional)
+        Seed of the random move played when the search finds no move.
+        Without one, it comes from `np.random`.
+
+    verbose : bool (optional)
+        Print the result of each search.
+
+    Attributes
+    ----------
+    result : bool or None
+        True if the last `solve` proved a win, False if it disproved one,
+        None if it stopped before either.
+
+    nodes : int
+        Number of nodes expanded by the last `solve`.
+    """
+
+    def __init__(self,
+                 initial_moves_fn=null_im,
+                 limited_moves_fn=advanced_lm,
+                 max_nodes=100000,
+                 max_entries=1000000,
+                 timeout=10.,
+                 tree_file=None,
+                 seed=None,
+                 verbose=False):
+        super(ProofNumberPlayer, self).__init__()
+        self.initial_moves_fn = initial_moves_fn
+        self.limited_moves_fn = limited_moves_fn
+        self.max_nodes = max_nodes
+        self.max_entries = max_entries
+        self.timer_threshold = timeout
+        self.time_left = None
+        self.tree_file = tree_file
+        self.verbose = verbose
+        self.random_state = np.random.RandomState(seed) \
+            if seed is not None else None
+        self.result = None
+        self.nodes = 0
+        self.clear()
+        if tree_file is not None and os.path.exists(tree_file):
+            self.load(tree_file)
+
+    def clear(self):
+        # table[(zobrist_hash, attacker)] is (phi, delta) of the position;
+        # _board_key is (height, width, m, zobrist_seed) of the boards the
+        # hashes are of
+        self.table = {}
+        self._board_key = None
+
+    def save(self, filename=None):
+        """Save the table to `filename` (by default `tree_file`)."""
+        filename = filename or self.tree_file
+        tmp_filename = filename + '.tmp'
+        with open(tmp_filename, 'wb') as f:
+            pickle.dump({'board_key': self._board_key, 'table': self.table},
+                        f, protocol=pickle.HIGHEST_PROTOCOL)
+        # Replace the old file only once the new one is complete
+        os.replace(tmp_filename, filename)
+
+    def load(self, filename=None):
+        """Load the table saved in `filename` (by default `tree_file`)."""
+        with open(filename or self.tree_file, 'rb') as f:
+            data = pickle.load(f)
+        self._board_key = data['board_key']
+        self.table = data['table']
+
+    def get_move(self, board, time_left):
+        """Play a proven win if there is one, else the most proving move
+        found within the budgets.
+
+        Parameters
+        ----------
+        board : board.Board
+            An instance of the generalized TIC-TAC-TOE board `Board` class
+            representing the current board state
+
+        time_left : callable
+            A function that returns the number of milliseconds left in the
+            current turn. Returning with any less than 0 ms remaining forfeits
+            the game.
+
+        Returns
+        -------
+        (int, int)
+            Board coordinates corresponding to a legal move; may return
+            (-1, -1) if there are no available legal moves.
+        """
+        initial_move = self.initial_moves_fn(board)
+        if initial_move:
+            return initial_move
+
+        self.time_left = time_left
+        try:
+            result = self.solve(board, self.player_mark)
+        finally:
+            self.time_left = None
+        if self.verbose:
+            print('Proof-number search: {} ({} nodes, {} entries)'.format(
+                {True: 'win', False: 'no win', None: 'unknown'}[result],
+                self.nodes, len(self.table)))
+
+        best_move = self.best_move(board, self.player_mark)
+        if best_move is None:
+            if not board.legal_moves:
+                return (-1, -1)
+            if self.verbose:
+                print('Randomly get a best_move')
+            random_state = self.random_state \
+                if self.random_state is not None else np.random
+            best_move = board.legal_moves[
+                random_state.choice(len(board.legal_moves))]
+        return best_move
+
+    def solve(self, board, player_mark):
+        """Prove or disprove a win of `player_mark`, to move on `board`.
+
+        Returns
+        -------
+        bool or None
+            True if `player_mark` wins, False if it doesn't, None if the
+            search stopped at `max_nodes` or the timer first.
+        """
+        board_key = (board.height, board.width, board.m, board.zobrist_seed)
+        if board_key != self._board_key:
+            self.clear()
+            self._board_key = board_key
+        self._attacker = player_mark
+        self.nodes = 0
+
+        self._mid(board, player_mark, INF, INF)
+        phi, delta = self.table.get((board.zobrist_hash, player_mark),
+                                    (1, 1))
+        self.result = True if phi == 0 else False if delta == 0 else None
+        if self.tree_file is not None:
+            self.save()
+        return self.result
+
+    def best_move(self, board, player_mark):
+        """Return the move of `player_mark`, to move, with the least
+        disproof number for it after the last `solve`: a winning move if it
+        proved one. None if there are no moves.
+        """
+        self._attacker = player_mark
+        _, moves = self._expand(board, player_mark)
+        best_move = None
+        best_value = None
+        for move in moves:
+            board.push(move, player_mark)
+            try:
+                phi, delta = self.table.get(
+                    (board.zobrist_hash, player_mark), (1, 1))
+            finally:
+                board.pop()
+            if best_value is None or (delta, phi) < best_value:
+                best_move = move
+                best_value = (delta, phi)
+        return best_move
+
+    def _out_of_budget(self):
+        return self.nodes >= self.max_nodes or (
+            self.time_left is not None
+            and self.time_left() < self.timer_threshold)
+
+    def _store(self, key, value):
+        self.table[key] = value
+        if len(self.table) > self.max_entries:
+            self._collect()
+
+    def _collect(self):
+        # Drop unsolved entries down to half the budget, those with the
+        # least proof and disproof numbers first, which are the cheapest to
+        # search again
+        unsolved = sorted((v[0] + v[1], k) for k, v in self.table.items()
+                          if v[0] != 0 and v[1] != 0)
+        n_drop = len(self.table) - self.max_entries // 2
+        for _, k in unsolved[:n_drop]:
+            del self.table[k]
+
+    def _expand(self, board, player_mark):
+        """Return the (phi, delta) of a node decided without searching, or
+        None, and the moves of the node.
+        """
+        if board.winner is not None:
+            return ((0, INF) if board.winner == player_mark
+                    else (INF, 0)), []
+
+        opponent_mark = get_opponent(player_mark)
+        bits = board.get_stone_bits(player_mark)
+        opp_bits = board.get_stone_bits(opponent_mark)
+        wins = ThreatSpaceSolver.fours(board, bits, opp_bits)
+        if wins:
+            return (0, INF), board.geometry.mask_cells(wins)[:1]
+
+        # The opponent wins unless its winning cell is blocked
+        threats = ThreatSpaceSolver.fours(board, opp_bits, bits)
+        if threats:
+            moves = board.geometry.mask_cells(threats)
+            return ((INF, 0) if len(moves) > 1 else None), moves
+
+        moves = list(self.limited_moves_fn(board, player_mark)) \
+            or board.legal_moves
+        if not moves:
+            # A draw is a disproof, whoever is to move
+            return ((INF, 0) if player_mark == self._attacker
+                    else (0, INF)), []
+        return None, moves
+
+    def _mid(self, board, player_mark, th_phi, th_delta):
+        """Search the node of `player_mark` to move until its phi reaches
+        `th_phi` or its delta reaches `th_delta`, and store its numbers.
+        """
+        key = (board.zobrist_hash, self._attacker)
+        self.nodes += 1
+        value, moves = self._expand(board, player_mark)
+        if value is not None:
+            self._store(key, value)
+            return
+
+        # Hashes of the children, to look up their numbers
+        child_keys = []
+        for move in moves:
+            board.push(move, player_mark)
+            child_keys.append((board.zobrist_hash, self._attacker))
+            board.pop()
+        opponent_mark = get_opponent(player_mark)
+
+        while True:
+            # The node is won if a child is lost for the opponent, and lost
+            # if every child is won for it
+            children = [self.table.get(k, (1, 1)) for k in child_keys]
+            phi = min(c[1] for c in children)
+            delta = min(INF, sum(c[0] for c in children))
+            if phi >= th_phi or delta >= th_delta or self._out_of_budget():
+                self._store(key, (phi, delta))
+                return
+
+            # Search the most proving child, until it stops being so
+            best = 0
+            delta_2 = INF
+            for k in range(1, len(children)):
+                if children[k][1] < children[best][1]:
+                    delta_2 = children[best][1]
+                    best = k
+                elif children[k][1] < delta_2:
+                    delta_2 = children[k][1]
+            child_phi = children[best][0]
+            board.push(moves[best], player_mark)
+            try:
+                self._mid(board, opponent_mark,
+                          min(INF, th_delta - delta + child_phi),
+                          min(th_phi, delta_2 + 1))
+            finally:
+                board.pop()
@@ -0,0 +1,81 @@
+import threading
+
+
+class Ponderer(object):
+    """Thinks with a player in a background thread during the opponent's
+    turn.
+
+    If the player predicts the opponent's reply (see
+    `Player.predict_reply`), the thread searches the position after it
+    with `get_move`. When the opponent plays that reply (a ponder hit),
+    the running search goes on with the timer of the player's turn and
+    its move is played, so the time pondered counts for the move.
+    Otherwise the thread runs `Player.ponder`, which keeps what it finds
+    in the player's tables for the next `get_move`.
+
+    The thread shares the interpreter with the caller, which should be
+    waiting for the opponent (sleeping or polling a server) meanwhile. In
+    a local game, it takes CPU time from the opponent's search.
+
+    Parameters
+    ----------
+    player : players.players.Player
+        The pondering player.
+    """
+
+    def __init__(self, player):
+        self.player = player
+        self._thread = None
+        self._key = None
+        self._result = None
+        self._timer = None
+
+    def _time_left(self):
+        return self._timer()
+
+    def start(self, board):
+        """Start pondering on `board`, the opponent to move."""
+        self.stop()
+        # The timer doesn't run out until the opponent has moved
+        self._timer = lambda: float("inf")
+        self._result = None
+        self._key = None
+        board = board.copy()
+        reply = self.player.predict_reply(board)
+        if reply is not None:
+            board.push(reply, self.player.opponent_mark)
+            if board.winner is not None or board.n_legal_moves == 0:
+                # Nothing to search after that reply
+                return
+            self._key = board.zobrist_hash
+            target = self._search
+        else:
+            target = self.player.ponder
+        self._thread = threading.Thread(
+            target=target, args=(board, self._time_left), daemon=True)
+        self._thread.start()
+
+    def _search(self, board, time_left):
+        self._result = self.player.get_move(board, time_left)
+
+    def stop(self):
+        """Stop pondering and wait for the thread."""
+        if self._thread is not None:
+            self._timer = lambda: float("-inf")
+            self._thread.join()
+            self._thread = None
+
+    def get_move(self, board, time_left):
+        """Return the move of the player on `board`, after the opponent's
+        move, using the pondered search on a ponder hit.
+        """
+        if self._thread is not None and self._key == board.zobrist_hash:
+            if getattr(self.player, 'verbose', False):
+                print('Ponder hit!')
+            self._timer = time_left
+            self._thread.join()
+            self._thread = None
+            if self._result is not None and self._result != (-1, -1):
+                return self._result
+        self.stop()
+        return self.player.get_move(board, time_left)
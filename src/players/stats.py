@@ -0,0 +1,104 @@
+class SearchStats(object):
+    """Statistics of the search of a move.
+
+    The player builds them when the search ends, from counters the search
+    keeps anyway: the node counter of the timer checks, the hits of the
+    transposition table, the cutoffs counted by the move ordering and the
+    times of the depths. Only the evaluations are counted for the stats,
+    next to the call of the heuristic. For a parallel search, the counts
+    are those of the main process, except that a root-split search adds
+    the nodes of its workers.
+
+    Attributes
+    ----------
+    nodes : int
+        Number of nodes searched.
+
+    evaluations : int
+        Number of positions scored by the heuristic.
+
+    tt_hits, tt_probes : int
+        Hits and probes of the transposition table.
+
+    cutoffs, first_move_cutoffs : int
+        Beta cutoffs, and those caused by the first move tried.
+
+    depths : list of (int, int, float)
+        (depth, nodes, seconds) of the depths completed.
+
+    completed_depth : int
+        The deepest depth completed.
+
+    timed_out : bool
+        Whether the search ran out of time in the middle of a depth.
+
+    time : float
+        Time of the search, in seconds.
+    """
+
+    def __init__(self,
+                 nodes=0,
+                 evaluations=0,
+                 tt_hits=0,
+                 tt_probes=0,
+                 cutoffs=0,
+                 first_move_cutoffs=0,
+                 depths=(),
+                 completed_depth=0,
+                 timed_out=False,
+                 time=0.):
+        self.nodes = nodes
+        self.evaluations = evaluations
+        self.tt_hits = tt_hits
+        self.tt_probes = tt_probes
+        self.cutoffs = cutoffs
+        self.first_move_cutoffs = first_move_cutoffs
+        self.depths = list(depths)
+        self.completed_depth = completed_depth
+        self.timed_out = timed_out
+        self.time = time
+
+    @property
+    def nps(self):
+        """Nodes searched per second."""
+        return self.nodes / self.time if self.time > 0 else 0.
+
+    @property
+    def tt_hit_rate(self):
+        return self.tt_hits / self.tt_probes if self.tt_probes else 0.
+
+    @property
+    def first_move_cutoff_rate(self):
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.
+
+    def as_dict(self):
+        """Return the stats as a flat dict, e.g. to aggregate the searches
+        of a game in a `pandas.DataFrame`.
+        """
+        return {
+            'nodes': self.nodes,
+            'evaluations': self.evaluations,
+            'tt_hits': self.tt_hits,
+            'tt_probes': self.tt_probes,
+            'tt_hit_rate': self.tt_hit_rate,
+            'cutoffs': self.cutoffs,
+            'first_move_cutoffs': self.first_move_cutoffs,
+            'first_move_cutoff_rate': self.first_move_cutoff_rate,
+            'completed_depth': self.completed_depth,
+            'timed_out': self.timed_out,
+            'time': self.time,
+            'nps': self.nps,
+        }
+
+    def __str__(self):
+        lines = ['Depth {}: {} nodes, {} evaluations, {:.3f} s, {:.0f} nps'
+                 .format(self.completed_depth, self.nodes, self.evaluations,
+                         self.time, self.nps),
+                 'TT hits: {} / {} ({:.1%})'.format(
+                     self.tt_hits, self.tt_probes, self.tt_hit_rate),
+                 'Cutoffs: {} ({:.1%} by the first move)'.format(
+                     self.cutoffs, self.first_move_cutoff_rate)]
+        for depth, nodes, seconds in self.depths:
+            lines.append('  depth {}: {} nodes, {:.3f} s'.format(
+                depth, nodes, seconds))
+        return '\n'.join(lines)
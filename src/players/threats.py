@@ -0,0 +1,227 @@
+import time
+
+from utils import get_opponent
+
+
+class ThreatSpaceSolver(object):
+    """Threat-space search for forced wins in m-in-a-row.
+
+    The solver looks for victories by continuous fours (VCF). A four is a
+    line of m cells holding m - 1 stones of a player and one empty cell,
+    which wins at the next move unless the opponent takes that cell. The
+    attacker only plays moves making a four, so the defender's replies are
+    forced, and wins when a move makes two fours at once. Only these moves
+    are searched, so a forced win many plies deep is found in a few hundred
+    nodes, where alpha-beta sees 3 or 4 plies.
+
+    Stones and fours are kept as cell masks (see `BoardGeometry.bits`) and
+    updated incrementally, and results are cached by position.
+
+    Parameters
+    ----------
+    max_depth : int (optional)
+        Maximum number of attacking moves in a win.
+
+    max_nodes : int (optional)
+        Maximum number of positions searched by one call of `find_win`.
+        A search stopped by this limit is not proven and isn't cached.
+
+    max_time : float (optional)
+        Time limit (in milliseconds) of `get_forced_move`, which stops the
+        searches like `max_nodes`.
+
+    max_cache : int (optional)
+        Number of cached results above which the cache is emptied.
+    """
+
+    def __init__(self, max_depth=12, max_nodes=5000, max_time=1000.,
+                 max_cache=200000):
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        self.max_time = max_time
+        self.max_cache = max_cache
+        self._deadline = None
+        self.clear()
+
+    def clear(self):
+        # cache[(zobrist_hash, attacker)] is (depth, win): the winning
+        # sequence of the attacker to move, or None if there is none within
+        # depth attacking moves
+        self.cache = {}
+        self.nodes = 0
+        self.complete = True
+
+    def _out_of_budget(self):
+        return self.nodes >= self.max_nodes or (
+            self._deadline is not None and time.time() > self._deadline)
+
+    @staticmethod
+    def fours(board, bits, opp_bits, windows=None):
+        """Return the mask of the cells completing a line of the player with
+        stones `bits`, among the windows of index in `windows` (all of them
+        by default).
+        """
+        geometry = board.geometry
+        window_bits = geometry.window_bits
+        n = board.m - 1
+        cells = 0
+        for w in (range(len(window_bits)) if windows is None else windows):
+            mask = window_bits[w]
+            if mask & opp_bits == 0 and bin(mask & bits).count('1') == n:
+                cells |= mask & ~bits
+        return cells
+
+    @staticmethod
+    def four_moves(board, bits, opp_bits):
+        """Return the mask of the cells where the player with stones `bits`
+        makes a four.
+        """
+        n = board.m - 2
+        cells = 0
+        for mask in board.geometry.window_bits:
+            if mask & opp_bits == 0 and bin(mask & bits).count('1') == n:
+                cells |= mask & ~bits
+        return cells
+
+    def find_win(self, board, attacker):
+        """Search a VCF of `attacker`, as if it were to move.
+
+        Returns
+        -------
+        list of (int, int) or None
+            The moves of the win, the attacker's and the forced replies
+            alternately, or None if no win was found. `complete` tells
+            whether the search finished within `max_nodes`.
+        """
+        defender = get_opponent(attacker)
+        a_bits = board.get_stone_bits(attacker)
+        d_bits = board.get_stone_bits(defender)
+        state = (a_bits, d_bits, self.fours(board, a_bits, d_bits),
+                 self.fours(board, d_bits, a_bits))
+        if len(self.cache) > self.max_cache:
+            self.cache = {}
+        self.nodes = 0
+        win = self._vcf(board, attacker, defender, state, self.max_depth)
+        self.complete = not self._out_of_budget()
+        return win
+
+    def _vcf(self, board, attacker, defender, state, depth):
+        a_bits, d_bits, a_fours, d_fours = state
+        geometry = board.geometry
+        if a_fours:
+            return [geometry.mask_cells(a_fours)[0]]
+        if depth <= 0 or self._out_of_budget():
+            return None
+
+        key = (board.zobrist_hash, attacker)
+        cached = self.cache.get(key)
+        if cached is not None and (cached[1] is not None
+                                   or cached[0] >= depth):
+            return cached[1]
+        self.nodes += 1
+
+        if d_fours:
+            # The defender threatens to win, so the attacker has to block,
+            # and can't block two cells
+            candidates = 0 if d_fours & (d_fours - 1) else d_fours
+        else:
+            candidates = self.four_moves(board, a_bits, d_bits)
+
+        win = None
+        for move in geometry.mask_cells(candidates):
+            bit = geometry.bits[move]
+            new_a_bits = a_bits | bit
+            new_a_fours = (a_fours & ~bit) | self.fours(
+                board, new_a_bits, d_bits, geometry.cell_windows[move])
+            if not new_a_fours or d_fours & ~bit:
+                continue
+            if new_a_fours & (new_a_fours - 1):
+                # Two fours: the defender can only block one
+                win = [move]
+                break
+
+            # The defender's reply is forced
+            reply = geometry.mask_cells(new_a_fours)[0]
+            new_d_bits = d_bits | geometry.bits[reply]
+            new_d_fours = self.fours(board, new_d_bits, new_a_bits,
+                                     geometry.cell_windows[reply])
+            board.push(move, attacker)
+            board.push(reply, defender)
+            try:
+                sub = self._vcf(board, attacker, defender,
+                                (new_a_bits, new_d_bits, 0, new_d_fours),
+                                depth - 1)
+            finally:
+                board.pop()
+                board.pop()
+            if sub is not None:
+                win = [move, reply] + sub
+                break
+
+        if win is not None or not self._out_of_budget():
+            self.cache[key] = (depth, win)
+        return win
+
+    def find_defences(self, board, defender):
+        """Find the moves of `defender`, to move, which stop every VCF of
+        the opponent.
+
+        Returns
+        -------
+        list of (int, int) or None
+            None if the opponent has no VCF. Otherwise the moves after
+            which it has none, which may be empty if the game is lost, or
+            if the searches were stopped by `max_nodes`.
+        """
+        attacker = get_opponent(defender)
+        threat = self.find_win(board, attacker)
+        if threat is None:
+            return None
+
+        # A defence takes a cell of a four the attacker could make, or
+        # makes a four, which the attacker has to answer first
+        a_bits = board.get_stone_bits(attacker)
+        d_bits = board.get_stone_bits(defender)
+        candidates = self.four_moves(board, a_bits, d_bits) \
+            | self.fours(board, a_bits, d_bits) \
+            | self.four_moves(board, d_bits, a_bits)
+        for move in threat:
+            candidates |= board.geometry.bits[move]
+        candidates &= board.empty_bits
+
+        defences = []
+        for move in board.geometry.mask_cells(candidates):
+            board.push(move, defender)
+            try:
+                stopped = self.find_win(board, attacker) is None \
+                    and self.complete
+            finally:
+                board.pop()
+            if stopped:
+                defences.append(move)
+        return defences
+
+    def get_forced_move(self, board, player_mark, time_left=None):
+        """Return a move of `player_mark`, to move, which wins by force, or
+        the only move which stops a forced win of the opponent. The search
+        stops after `max_time`, or `time_left` milliseconds if sooner.
+
+        Returns
+        -------
+        ((int, int), list of (int, int))
+            The forced move, or None, and the moves which stop a forced win
+            of the opponent when there are several (None if it has none).
+        """
+        max_time = self.max_time if time_left is None \
+            else min(self.max_time, time_left)
+        self._deadline = time.time() + max_time / 1000.
+        try:
+            win = self.find_win(board, player_mark)
+            if win is not None:
+                return win[0], None
+            defences = self.find_defences(board, player_mark)
+        finally:
+            self._deadline = None
+        if defences is not None and len(defences) == 1:
+            return defences[0], None
+        return None, defences or None
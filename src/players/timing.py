@@ -0,0 +1,138 @@
+import timeit
+
+
+class TimeManager(object):
+    """Clock of a player over a game, allocating the time of each move.
+
+    The game loop starts the clock of each move with `start_move`, which
+    returns the timer to give to `Player.get_move`, and stops it with
+    `stop_move` when the move is played. Without a game budget, a move gets
+    the whole `move_time`. With one, the time left in the game is spread
+    over the moves the player can still have to play, at most
+    `moves_to_go`, so the early moves don't eat the time of the late ones.
+
+    Parameters
+    ----------
+    move_time : float
+        Time limit (in milliseconds) of a move.
+
+    game_time : float (optional)
+        Time (in milliseconds) for all the moves of the player in a game,
+        or None if only the moves are timed.
+
+    moves_to_go : int (optional)
+        The most moves the time left in the game is spread over.
+
+    Attributes
+    ----------
+    game_time_left : float
+        Time left in the game, None without a game budget.
+
+    budget : float
+        Time allocated to the current (or last) move.
+    """
+
+    def __init__(self, move_time, game_time=None, moves_to_go=20):
+        self.move_time = move_time
+        self.game_time = game_time
+        self.moves_to_go = moves_to_go
+        self.budget = move_time
+        self._start = None
+        self.new_game()
+
+    def new_game(self):
+        self.game_time_left = self.game_time
+
+    def start_move(self, board):
+        """Start the clock of the move of the player on `board`.
+
+        Returns
+        -------
+        callable
+            A function returning the number of milliseconds left in the time
+            allocated to the move.
+        """
+        budget = self.move_time
+        if self.game_time_left is not None:
+            # Each player plays at most half the empty cells
+            moves_left = max(1, min(self.moves_to_go,
+                                    (board.n_legal_moves + 1) // 2))
+            budget = min(budget, max(0., self.game_time_left) / moves_left)
+        self.budget = budget
+        start = self._start = timeit.default_timer()
+        return lambda: budget - 1000. * (timeit.default_timer() - start)
+
+    def stop_move(self):
+        """Stop the clock of the move and charge its time to the game.
+        Returns the time (in milliseconds) the move took.
+        """
+        elapsed = 1000. * (timeit.default_timer() - self._start)
+        if self.game_time_left is not None:
+            self.game_time_left -= elapsed
+        return elapsed
+
+
+class IterationTimer(object):
+    """Times the depths of an iterative deepening search, and predicts the
+    time of the next depth from the effective branching factor.
+
+    The effective branching factor (EBF) of a depth is the ratio of the
+    nodes it searched to those searched by the depth before. Alpha-beta
+    goes much further from an odd depth to an even one than from an even
+    depth to an odd one, so the next depth is predicted with the last EBF
+    measured for a depth of the same parity. The EBFs are kept for the next
+    search, which starts from a depth where there is none yet.
+
+    A depth of fewer than `min_nodes` nodes is timed mostly by fixed costs,
+    like sending the root moves to the workers of a root-split search, so
+    the next depth isn't predicted from it.
+
+    Parameters
+    ----------
+    min_nodes : int (optional)
+        The fewest nodes of a depth to predict the next one from.
+
+    Attributes
+    ----------
+    depths : list of (int, int, float)
+        (depth, nodes, seconds) of the depths completed by the search.
+
+    ebf : dict
+        The last effective branching factor of the odd (1) and even (0)
+        depths.
+    """
+
+    def __init__(self, min_nodes=1000):
+        self.min_nodes = min_nodes
+        self.ebf = {}
+        self.start()
+
+    def start(self, nodes=0):
+        """Start timing a search, at `nodes` on the node counter."""
+        self.depths = []
+        self._nodes = nodes
+        self._time = timeit.default_timer()
+
+    def record(self, depth, nodes):
+        """Record the completion of `depth`, at `nodes` on the counter."""
+        now = timeit.default_timer()
+        if self.depths and self.depths[-1][0] == depth - 1 \
+                and self.depths[-1][1] > 0:
+            self.ebf[depth % 2] = \
+                float(nodes - self._nodes) / self.depths[-1][1]
+        self.depths.append((depth, nodes - self._nodes, now - self._time))
+        self._nodes = nodes
+        self._time = now
+
+    def predict(self):
+        """Return the predicted time (in milliseconds) of the next depth, or
+        None if no depth of the search is completed, the last one searched
+        too few nodes, or no EBF is measured.
+        """
+        if not self.depths or not self.ebf \
+                or self.depths[-1][1] < self.min_nodes:
+            return None
+        depth = self.depths[-1][0] + 1
+        # The other parity if this one isn't measured yet
+        ebf = self.ebf.get(depth % 2, self.ebf.get(1 - depth % 2))
+        return 1000. * self.depths[-1][2] * ebf
@@ -0,0 +1,183 @@
+import json
+import math
+import timeit
+
+
+# Parts of the search whose time a trace measures
+PARTS = ('movegen', 'eval', 'board')
+
+
+def encode_score(score):
+    """Return `score` for JSON, which has no infinity, the score of a
+    won or lost game.
+    """
+    if score is None or not math.isinf(score):
+        return score
+    return 'inf' if score > 0 else '-inf'
+
+
+class _TimedCall(object):
+    """Callable timing the calls of `fn` into `times[part]`."""
+
+    def __init__(self, fn, times, part):
+        self.fn = fn
+        self.times = times
+        self.part = part
+
+    def __call__(self, *args, **kw):
+        start = timeit.default_timer()
+        try:
+            return self.fn(*args, **kw)
+        finally:
+            self.times[self.part] += timeit.default_timer() - start
+
+
+class _TimedScore(object):
+    """Score function timing the calls of `get_score` of `score_fn`."""
+
+    def __init__(self, score_fn, times):
+        self.score_fn = score_fn
+        self.get_score = _TimedCall(score_fn.get_score, times, 'eval')
+
+
+class SearchTracer(object):
+    """Opt-in trace of the searches of `MinimaxPlayer` and
+    `AlphaBetaPlayer`, written as JSON lines.
+
+    Each depth completed writes a record of type 'depth', and each search
+    a record of type 'search' when it ends. Both hold the position (hash
+    and step), the best move, principal variation and score, the nodes
+    searched, and the time spent in move generation (`limited_moves_fn`),
+    evaluation (`score_fn`) and board updates (`push` and `pop`). The rest
+    of the time goes to the search itself: ordering, table lookups and the
+    timer. A search record also tells whether the search timed out.
+
+    The times are measured by wrapping those calls for the time of a traced
+    search, so a traced search runs a little slower than an untraced one;
+    an untraced player pays nothing. For a parallel search, the times are
+    those of the main process, and the board updates aren't timed, as the
+    board is sent to other processes. See `analyze_trace.py` for a summary
+    of traces.
+
+    Parameters
+    ----------
+    filename : str
+        The trace file. Records are appended to it, so the games of a
+        tournament can share a file.
+
+    label : str (optional)
+        Name of the traced player in the records, by default its class
+        and mark.
+
+    Attributes
+    ----------
+    games : dict
+        Number of games started by each player traced, by name.
+    """
+
+    def __init__(self, filename, label=None):
+        self.filename = filename
+        self.label = label
+        self.games = {}
+        self._file = open(filename, 'a')
+        self._times = None
+        self._start = None
+        self._last = None
+        self._saved = None
+        self._board_classes = {}
+
+    def close(self):
+        self._file.close()
+
+    def new_game(self, player):
+        name = self._name(player)
+        self.games[name] = self.games.get(name, 0) + 1
+
+    def _name(self, player):
+        return self.label or '{}:{}'.format(
+            type(player).__name__, player.player_mark)
+
+    def start_search(self, player, board):
+        """Start tracing the search of `player` on `board`."""
+        self._times = dict.fromkeys(PARTS, 0.)
+        self._start = self._last = \
+            (timeit.default_timer(), dict(self._times), 0, 0)
+        self._saved = (player.limited_moves_fn, player.score_fn,
+                       board.__class__)
+        player.limited_moves_fn = _TimedCall(
+            player.limited_moves_fn, self._times, 'movegen')
+        player.score_fn = _TimedScore(player.score_fn, self._times)
+        if getattr(player, 'n_workers', 1) == 1:
+            board.__class__ = self._timed_board_class(board.__class__)
+
+    def end_depth(self, player, board, depth):
+        """Write the record of `depth`, just completed."""
+        self._write(self._record('depth', player, board, depth,
+                                 player.pv[0] if player.pv else None,
+                                 self._last))
+        self._last = (timeit.default_timer(), dict(self._times),
+                      player.nodes, player.evaluations)
+
+    def end_search(self, player, board, move, timed_out):
+        """Write the record of the search, which played `move`, and stop
+        tracing it.
+        """
+        player.limited_moves_fn, player.score_fn, board.__class__ = \
+            self._saved
+        record = self._record('search', player, board,
+                              player.completed_depth, move, self._start)
+        record['timeout'] = timed_out
+        self._write(record)
+        self._times = None
+
+    def _record(self, record_type, player, board, depth, move, since):
+        start, times, nodes, evaluations = since
+        name = self._name(player)
+        return {
+            'type': record_type,
+            'game': self.games.get(name, 0),
+            'player': name,
+            'hash': '{:016x}'.format(board.zobrist_hash),
+            'step': board.n_step,
+            'depth': depth,
+            'move': list(move) if move is not None else None,
+            'pv': [list(m) for m in player.pv],
+            'score': encode_score(player.best_score),
+            'nodes': player.nodes - nodes,
+            'evaluations': player.evaluations - evaluations,
+            'time': timeit.default_timer() - start,
+            'times': {part: self._times[part] - times[part]
+                      for part in PARTS},
+        }
+
+    def _timed_board_class(self, board_class):
+        """Return a subclass of `board_class` timing `push` and `pop`, which
+        a board is switched to for the time of a traced search.
+        """
+        if board_class not in self._board_classes:
+            tracer = self
+            push, pop = board_class.push, board_class.pop
+
+            def timed_push(board, move, player_mark):
+                start = timeit.default_timer()
+                try:
+                    return push(board, move, player_mark)
+                finally:
+                    tracer._times['board'] += timeit.default_timer() - start
+
+            def timed_pop(board):
+                start = timeit.default_timer()
+                try:
+                    return pop(board)
+                finally:
+                    tracer._times['board'] += timeit.default_timer() - start
+
+            # No new slots, so the layout is the same as the base class
+            self._board_classes[board_class] = type(
+                'Traced' + board_class.__name__, (board_class,),
+                {'__slots__': (), 'push': timed_push, 'pop': timed_pop})
+        return self._board_classes[board_class]
+
+    def _write(self, record):
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
@@ -0,0 +1,202 @@
+import multiprocessing
+from array import array
+
+
+# Types of the bound stored with a score
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+
+class TranspositionTable(object):
+    """Fixed-size transposition table keyed by the Zobrist hash of a board.
+
+    Each bucket holds two entries: a depth-preferred slot, which is only
+    replaced by a search at least as deep or by a later search, and an
+    always-replace slot, which takes whatever the depth-preferred slot
+    refuses. An entry stores the search depth, bound type, score and best
+    move of a position, and the generation of the search which stored it.
+
+    A table kept between the moves of a game starts a new generation for
+    each move (see `new_generation`), so the deep entries of positions the
+    game has left behind don't hold the depth-preferred slots forever.
+
+    Scores are stored as they are given, so a table must only be shared by
+    searches that score positions from the same player's point of view.
+
+    Parameters
+    ----------
+    size_mb : float
+        Memory cap of the table in megabytes. The number of buckets is
+        rounded down to a power of two.
+
+    shared : bool (optional)
+        Keep the entries in shared memory, so processes forked (or spawned
+        with the table as an argument) after it is made read and write the
+        same table. Writers don't lock: the key of an entry is stored XOR
+        the rest of the entry, so an entry torn by two processes writing at
+        once doesn't match any position and is read as a miss.
+    """
+
+    # Bytes per entry: key (8), score (8), move (4), depth (2), bound (1),
+    # generation (1)
+    ENTRY_BYTES = 24
+
+    # Type codes of the entry fields
+    TYPECODES = (('keys', 'Q'), ('scores', 'd'), ('moves', 'i'),
+                 ('depths', 'h'), ('flags', 'b'), ('generations', 'B'))
+
+    def __init__(self, size_mb=16, shared=False):
+        n_buckets = max(1, int(size_mb * 2 ** 20 / (2 * self.ENTRY_BYTES)))
+        self.n_buckets = 1 << (n_buckets.bit_length() - 1)
+        self.size = 2 * self.n_buckets
+        self.shared = shared
+        self._mask = self.n_buckets - 1
+        if shared:
+            self._buffers = {
+                name: multiprocessing.RawArray(typecode, self.size)
+                for name, typecode in self.TYPECODES}
+        else:
+            self._buffers = {
+                name: array(typecode, bytes(array(typecode).itemsize
+                                            * self.size))
+                for name, typecode in self.TYPECODES}
+        self._set_views()
+        self.clear()
+
+    def _set_views(self):
+        # Index the buffers through memoryviews of their type, and the raw
+        # bits of the scores through a second view, for the key check
+        for name, typecode in self.TYPECODES:
+            setattr(self, name,
+                    memoryview(self._buffers[name]).cast('B').cast(typecode))
+        self._score_bits = memoryview(self._buffers['scores']) \
+            .cast('B').cast('Q')
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name, _ in self.TYPECODES:
+            del state[name]
+        del state['_score_bits']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._set_views()
+
+    def clear(self):
+        # Slot 2 * b is the depth-preferred entry of bucket b, and
+        # slot 2 * b + 1 the always-replace entry. The buffers are cleared
+        # in place, as other processes may share them.
+        self.keys[:] = array('Q', bytes(8 * self.size))
+        self.scores[:] = array('d', bytes(8 * self.size))
+        self.moves[:] = array('i', [-1]) * self.size
+        self.depths[:] = array('h', [-1]) * self.size
+        self.flags[:] = array('b', bytes(self.size))
+        self.generations[:] = array('B', bytes(self.size))
+        self.generation = 0
+        self.reset_counters()
+
+    def new_generation(self):
+        """Start the generation of a new search. Entries of older ones
+        stay readable, but give up their depth-preferred slots.
+        """
+        self.generation = (self.generation + 1) & 0xff
+
+    def reset_counters(self):
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+
+    @staticmethod
+    def encode_move(move):
+        if move is None:
+            return -1
+        return (int(move[0]) << 16) | int(move[1])
+
+    @staticmethod
+    def decode_move(code):
+        if code < 0:
+            return None
+        return (code >> 16, code & 0xffff)
+
+    @staticmethod
+    def _check(score_bits, move_code, depth, flag):
+        """Pack an entry into the word XORed with its key."""
+        return score_bits ^ (move_code & 0xffffffff) \
+            ^ (depth & 0xffff) << 32 ^ (flag & 0xff) << 48
+
+    def _key_at(self, s):
+        return self.keys[s] ^ self._check(self._score_bits[s], self.moves[s],
+                                          self.depths[s], self.flags[s])
+
+    def probe(self, key):
+        """Look up a position.
+
+        Returns
+        -------
+        (int, int, float, (int, int)) or None
+            The depth, bound type, score and best move stored for `key`, or
+            None if the position is not in the table.
+        """
+        slot = (key & self._mask) << 1
+        for s in (slot, slot + 1):
+            depth = self.depths[s]
+            if depth < 0:
+                continue
+            flag, score, move_code = \
+                self.flags[s], self.scores[s], self.moves[s]
+            score_bits = self._score_bits[s]
+            if self.keys[s] ^ self._check(score_bits, move_code, depth,
+                                          flag) == key:
+                self.hits += 1
+                return depth, flag, score, self.decode_move(move_code)
+        self.misses += 1
+        if self.depths[slot] >= 0 or self.depths[slot + 1] >= 0:
+            # The bucket is taken by other positions
+            self.collisions += 1
+        return None
+
+    def store(self, key, depth, flag, score, move):
+        slot = (key & self._mask) << 1
+        slot_key = self._key_at(slot)
+        if (slot_key == key or self.depths[slot] < 0
+                or depth >= self.depths[slot]
+                or self.generations[slot] != self.generation):
+            if slot_key != key and self.depths[slot] >= 0:
+                # Keep the old deep entry in the always-replace slot
+                self._write(slot + 1, slot_key, self.depths[slot],
+                            self.flags[slot], self.scores[slot],
+                            self.moves[slot], self.generations[slot])
+            elif self._key_at(slot + 1) == key:
+                self.depths[slot + 1] = -1
+        else:
+            slot += 1
+        self._write(slot, key, depth, flag, score, self.encode_move(move),
+                    self.generation)
+        self.stores += 1
+
+    def _write(self, slot, key, depth, flag, score, move_code, generation):
+        self.generations[slot] = generation
+        self.depths[slot] = depth
+        self.flags[slot] = flag
+        self.scores[slot] = score
+        self.moves[slot] = move_code
+        self.keys[slot] = key ^ self._check(self._score_bits[slot],
+                                            move_code, depth, flag)
+
+    @property
+    def usage(self):
+        """Fraction of the slots that hold an entry."""
+        return 1. - self.depths.tolist().count(-1) / self.size
+
+    def stats(self):
+        probes = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'collisions': self.collisions,
+            'stores': self.stores,
+            'hit_rate': self.hits / probes if probes else 0.,
+        }
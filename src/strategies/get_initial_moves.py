@@ -10,17 +10,16 @@ def null_im(board):
 
 
 def surround_moves(board, move, radius):
-    legal_moves = board.legal_moves.tolist()
     
     moves = []
     dist = []
     for i in range(move[0] - radius, move[0] + radius + 1):
         for j in range(move[1] - radius, move[1] + radius + 1):
-            if [i, j] in legal_moves:
+            if board.is_empty((i, j)):
                 moves.append((i, j))
                 dist.append(max(abs(move[0] - i), abs(move[1] - j)))
 
-    moves = [tuple(m) for m in np.array(moves)[np.argsort(dist)]]
+    moves = [moves[k] for k in np.argsort(dist)]
 
     return moves
 
@@ -3,41 +3,45 @@ from utils import *
 
 
 def null_lm(board, player_mark):
-    return [tuple(m) for m in board.legal_moves]
+    return board.legal_moves
 
 
 def surround_moves(board, move, radius):
-    legal_moves = board.legal_moves.tolist()
     
     moves = []
     dist = []
     for i in range(move[0] - radius, move[0] + radius + 1):
         for j in range(move[1] - radius, move[1] + radius + 1):
-            if [i, j] in legal_moves:
+            if board.is_empty((i, j)):
                 moves.append((i, j))
                 dist.append(max(abs(move[0] - i), abs(move[1] - j)))
 
-    moves = [tuple(m) for m in np.array(moves)[np.argsort(dist)]]
+    moves = [moves[k] for k in np.argsort(dist)]
 
     return moves
 
 
+# Indices in `BoardGeometry.DIRECTIONS` of the directions
+# (0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (-1, -1), (1, -1), (-1, 1)
+STAR_DIRECTIONS = (2, 6, 4, 0, 3, 7, 5, 1)
+
+
 def star_moves_block(board, moves, move, player_mark, opponent_mark, radius):
     
-    directions = ((0, 1), (0, -1), (1, 0), (-1, 0),
-                (1, 1), (-1, -1), (1, -1), (-1, 1))
+    rays = board.geometry.rays[move]
 
-    for d_i, d_j in directions:
+    for d in STAR_DIRECTIONS:
         count = 0
-        i, j = move
-        while count < radius - 1 and board.on_the_board((i + d_i, j + d_j)):
-            i, j = i + d_i, j + d_j
-            if board.get_mark((i, j)) == opponent_mark:
+        for cell in rays[d]:
+            if count >= radius - 1:
                 break
-            if (i, j) in moves:
+            mark = board.get_mark(cell)
+            if mark == opponent_mark:
+                break
+            if cell in moves:
                 continue
-            if board.get_mark((i, j)) != player_mark:
-                moves.append((i, j))
+            if mark != player_mark:
+                moves.append(cell)
             count += 1
             
     return moves
@@ -95,14 +99,17 @@ def advanced_lm(board, player_mark):
         board, opp_last_move, opp_mark, player_mark, radius_sur, radius_star)
 
     # Combine two move areas together
+    seen = set(moves)
     for m in moves_opp:
-        if m not in moves:
+        if m not in seen:
             moves.append(m)
+            seen.add(m)
     
     # Consider the surronding moves
     for m in board.surround_moves:
-        if m not in moves:
+        if m not in seen:
             moves.append(m)
+            seen.add(m)
     
     # For the beginning of the game, allow agent to do moves in center area
     if n_step < 6:
@@ -111,7 +118,8 @@ def advanced_lm(board, player_mark):
         center_move = (board_height // 2, board_width // 2)
         moves_center = surround_moves(board, center_move, center_radius)
         for m in moves_center:
-            if m not in moves:
+            if m not in seen:
                 moves.append(m)
+                seen.add(m)
     
     return moves
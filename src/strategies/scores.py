@@ -128,18 +128,14 @@ class AdvancedScore(Score):
         # The list storing moves of different directions
         moves_list = [''] * len(directions)
         
-        # Get moves
-        for i_direct, (d_i, d_j) in enumerate(directions):
-            count = 0
-            i, j = last_moves[player_mark]
-            while count < r:
-                i, j = i + d_i, j + d_j
-                if board.on_the_board((i, j)):
-                    m = board.get_mark((i, j))
-                else:
-                    m = get_opponent(player_mark)
-                moves_list[i_direct] += m
-                count += 1
+        # Get moves, treating cells off the board as the opponent's
+        rays = board.geometry.rays[last_moves[player_mark]]
+        off_board = get_opponent(player_mark)
+        for i_direct in range(len(directions)):
+            ray = rays[i_direct][:r]
+            moves_list[i_direct] = \
+                ''.join([board.get_mark(c) for c in ray]) \
+                + off_board * (r - len(ray))
         
         # ['----O', 'X-OOO', '--OOO', '--OOO', 
         #  '--OOO', '--OOO', '----O', 'OX--O']
@@ -157,18 +153,14 @@ class AdvancedScore(Score):
         # The list storing moves of different directions
         moves_list = [''] * len(directions)
         
-        # Get moves
-        for i_direct, (d_i, d_j) in enumerate(directions):
-            count = 0
-            i, j = last_moves[player_mark]
-            while count < r:
-                i, j = i + d_i, j + d_j
-                if board.on_the_board((i, j)):
-                    m = board.get_mark((i, j))
-                else:
-                    m = get_opponent(player_mark)
-                moves_list[i_direct] += m
-                count += 1
+        # Get moves, treating cells off the board as the opponent's
+        rays = board.geometry.rays[last_moves[player_mark]]
+        off_board = get_opponent(player_mark)
+        for i_direct in range(len(directions)):
+            ray = rays[i_direct][:r]
+            moves_list[i_direct] = \
+                ''.join([board.get_mark(c) for c in ray]) \
+                + off_board * (r - len(ray))
 
         # Get lines
         lines_list = []
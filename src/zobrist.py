@@ -0,0 +1,60 @@
+import random
+
+
+# Default seed of the Zobrist keys. Changing it invalidates every table that
+# was saved with hashes of the old keys.
+ZOBRIST_SEED = 6511
+
+
+class ZobristKeys(object):
+    """Random 64-bit keys for the cells of one board size.
+
+    The hash of a position is the XOR of the keys of its stones, and of
+    `side` when it is 'X' to move.
+
+    Parameters
+    ----------
+    height, width : int
+        Size of the board.
+
+    seed : int (optional)
+        Seed of the key generator. The keys only depend on the board size
+        and the seed, so hashes are the same in every process and persisted
+        tables stay valid.
+    """
+
+    def __init__(self, height, width, seed=ZOBRIST_SEED):
+        self.height = height
+        self.width = width
+        self.seed = seed
+
+        # A string seed is hashed with SHA-512, which is stable across
+        # processes and Python versions (unlike `hash()`).
+        rng = random.Random('zobrist:{}:{}x{}'.format(seed, height, width))
+        self.cells = {}
+        for mark in ('O', 'X'):
+            self.cells[mark] = [rng.getrandbits(64)
+                                for _ in range(height * width)]
+        self.side = rng.getrandbits(64)
+
+    def key(self, move, mark):
+        return self.cells[mark][move[0] * self.width + move[1]]
+
+    def hash_moves(self, moves):
+        """Hash the position made of `moves`, a list of (mark, move)."""
+        h = 0
+        for mark, move in moves:
+            h ^= self.key(move, mark)
+        if len(moves) % 2:
+            h ^= self.side
+        return h
+
+
+_keys = {}
+
+
+def get_zobrist_keys(height, width, seed=ZOBRIST_SEED):
+    """Return the (shared) Zobrist keys of a board size and seed."""
+    if (height, width, seed) not in _keys:
+        _keys[(height, width, seed)] = ZobristKeys(height, width, seed)
+    return _keys[(height, width, seed)]